@@ -6,12 +6,24 @@ import httpretty
 import pytest
 
 import dnstwister
+import dnstwister.api.checks.parked
+import dnstwister.api.checks.safebrowsing
 
 
 # Add dnstwister to import path
 sys.path.insert(0, 'dnstwister')
 
 
+@pytest.fixture(autouse=True)
+def empty_caches():
+    """Stop cached results leaking between tests."""
+    dnstwister.tools.FUZZ_CACHE.clear()
+    dnstwister.tools.RESOLVE_CACHE.clear()
+    dnstwister.api.WHOIS_CACHE.clear()
+    dnstwister.api.checks.parked.SCORE_CACHE.clear()
+    dnstwister.api.checks.safebrowsing.REPORT_CACHE.clear()
+
+
 @pytest.fixture
 def webapp():
     """Create a webapp fixture for accessing the site.
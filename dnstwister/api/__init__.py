@@ -8,14 +8,24 @@ from flask import current_app
 from dnstwister.api.checks import parked
 from dnstwister.api.checks import safebrowsing
 from dnstwister import tools
+from dnstwister.core.cache import shared_cache
 from dnstwister.core.domain import Domain
 
 
 app = flask.Blueprint('api', __name__)
 
+# Whois text, by IDNA domain.
+WHOIS_CACHE_SIZE = 10000
+WHOIS_CACHE = shared_cache('whois', WHOIS_CACHE_SIZE)
+WHOIS_TTL = 60 * 60 * 24  # seconds
+
 
 ENDPOINTS = ('parked_score', 'resolve_ip', 'fuzz')
 
+# Maximum domains resolved by one request to the batch IP resolution
+# endpoint.
+IP_BATCH_MAX = 500
+
 
 @app.route('/')
 def api_definition():
@@ -27,7 +37,13 @@ def api_definition():
         'parked_check_url': tools.api_url(parked_score, 'domain_as_hexadecimal'),
         'google_safe_browsing_url': tools.api_url(safebrowsing_check, 'domain_as_hexadecimal'),
         'ip_resolution_url': tools.api_url(resolve_ip, 'domain_as_hexadecimal'),
+        'ip_batch_resolution_url': urllib.parse.urljoin(
+            flask.request.url_root, flask.url_for('.resolve_ips')
+        ),
         'whois_url': tools.api_url(whois, 'domain_as_hexadecimal'),
+        'stats_url': urllib.parse.urljoin(
+            flask.request.url_root, flask.url_for('.stats')
+        ),
     })
 
 
@@ -66,16 +82,22 @@ def whois(hexdomain):
             'Malformed domain or domain not represented in hexadecimal format.'
         )
     payload = standard_api_values(domain, skip='whois')
-    try:
-        idna_domain = domain.to_ascii()
-        payload['whois_text'] = whois_mod.whois(idna_domain).text.strip()
-        if payload['whois_text'] == '':
-            raise Exception('No whois data retrieved')
-    except Exception as ex:
-        current_app.logger.error(
-            'Unable to retrieve whois info for domain: {}'.format(ex)
-        )
-        flask.abort(500, 'Unable to retrieve whois info')
+    idna_domain = domain.to_ascii()
+
+    whois_text = WHOIS_CACHE.get(idna_domain)
+    if whois_text is None:
+        try:
+            whois_text = whois_mod.whois(idna_domain).text.strip()
+            if whois_text == '':
+                raise Exception('No whois data retrieved')
+        except Exception as ex:
+            current_app.logger.error(
+                'Unable to retrieve whois info for domain: {}'.format(ex)
+            )
+            flask.abort(500, 'Unable to retrieve whois info')
+        WHOIS_CACHE.set(idna_domain, whois_text, ttl=WHOIS_TTL)
+
+    payload['whois_text'] = whois_text
 
     return flask.jsonify(payload)
 
@@ -90,12 +112,15 @@ def parked_score(hexdomain):
             'Malformed domain or domain not represented in hexadecimal format.'
         )
     payload = standard_api_values(domain, skip='parked_score')
-    score, score_text, redirects, dressed, dest = parked.get_score(domain)
+    (score, score_text, redirects, dressed, dest, bytes_read,
+     timed_out) = parked.get_score(domain)
     payload['score'] = score
     payload['score_text'] = score_text
     payload['redirects'] = redirects
     payload['redirects_to'] = None if dest is None else dest.to_ascii()
     payload['dressed'] = dressed
+    payload['bytes_read'] = bytes_read
+    payload['timed_out'] = timed_out
     return flask.jsonify(payload)
 
 
@@ -123,14 +148,66 @@ def resolve_ip(hexdomain):
             'Malformed domain or domain not represented in hexadecimal format.'
         )
 
-    ip_addr, error = tools.resolve(domain)
+    resolution = tools.resolve_details(domain)
+    ip_addr, error = resolution.result
 
     payload = standard_api_values(domain, skip='resolve_ip')
     payload['ip'] = ip_addr
     payload['error'] = error
+    payload['wildcard'] = resolution.wildcard
     return flask.jsonify(payload)
 
 
+@app.route('/ip', methods=['POST'])
+def resolve_ips():
+    """Resolves many Domains to IPs at once.
+
+    Takes a JSON body of {"domains_as_hexadecimal": [...]}, up to
+    IP_BATCH_MAX domains, and returns their results in the same order.
+    """
+    body = flask.request.get_json(silent=True)
+    try:
+        hexdomains = body['domains_as_hexadecimal']
+    except (KeyError, TypeError):
+        flask.abort(400, 'Missing "domains_as_hexadecimal" list.')
+
+    if not isinstance(hexdomains, list) or len(hexdomains) > IP_BATCH_MAX:
+        flask.abort(
+            400,
+            '"domains_as_hexadecimal" must be a list of at most {} '
+            'domains.'.format(IP_BATCH_MAX)
+        )
+
+    domains = []
+    for hexdomain in hexdomains:
+        domain = None
+        if isinstance(hexdomain, str):
+            domain = tools.try_parse_domain_from_hex(hexdomain)
+        if domain is None:
+            flask.abort(
+                400,
+                'Malformed domain or domain not represented in hexadecimal '
+                'format.'
+            )
+        domains.append(domain)
+
+    results = []
+    for (domain, resolution) in tools.resolve_all(domains, details=True):
+        ip_addr, error = resolution.result
+        results.append({
+            'domain': domain.to_ascii(),
+            'domain_as_hexadecimal': domain.to_hex(),
+            'ip': ip_addr,
+            'error': error,
+            'wildcard': resolution.wildcard,
+        })
+
+    return flask.jsonify({
+        'url': flask.request.base_url,
+        'results': results,
+    })
+
+
 @app.route('/to_hex/<domain_param>')
 def domain_to_hex(domain_param):
     """Helps you convert domains to hex."""
@@ -154,13 +231,32 @@ def fuzz(hexdomain):
             'Malformed domain or domain not represented in hexadecimal format.'
         )
 
-    fuzz_result = tools.fuzzy_domains(domain)
     fuzz_payload = []
-    for result in fuzz_result:
-        result_payload = standard_api_values(Domain(result['domain-name']), skip='url')
-        result_payload['fuzzer'] = result['fuzzer']
+    for result in tools.iter_fuzzy_domains(domain):
+        result_payload = standard_api_values(result.domain, skip='url')
+        result_payload['fuzzer'] = result.fuzzer
         fuzz_payload.append(result_payload)
 
     payload = standard_api_values(domain, skip='fuzz')
     payload['fuzzy_domains'] = fuzz_payload
     return flask.jsonify(payload)
+
+
+@app.route('/stats')
+def stats():
+    """Returns this process's DNS engine and cache counters."""
+    return flask.jsonify({
+        'url': flask.request.base_url,
+        'dns_engine': tools.DNS_ENGINE.stats,
+        'caches': {
+            'fuzz': tools.FUZZ_CACHE.stats,
+            'resolutions': tools.RESOLVE_CACHE.stats,
+            'shared_resolutions': (
+                None if tools.RESOLVE_SHARED_CACHE is None
+                else tools.RESOLVE_SHARED_CACHE.stats
+            ),
+            'whois': WHOIS_CACHE.stats,
+            'parked': parked.SCORE_CACHE.stats,
+            'safebrowsing': safebrowsing.REPORT_CACHE.stats,
+        },
+    })
@@ -1,8 +1,12 @@
 """Parked domain detection."""
+import concurrent.futures
+import time
+
 import requests
 
 import dnstwister.tools.tld_db as tld_db
 from dnstwister.api.checks import shared
+from dnstwister.core.cache import shared_cache
 
 PARKED_WORDS = (
     'domain',
@@ -27,18 +31,128 @@ REDIRECT_HINTS = (
     'refresh',
 )
 
+# Bytes of each page read, the rest is never downloaded.
 CONTENT_MAX = 1024 * 100
+CHUNK_SIZE = 1024 * 8
+
+# Scores, by IDNA domain.
+SCORE_CACHE_SIZE = 10000
+SCORE_CACHE = shared_cache('parked_scores', SCORE_CACHE_SIZE)
+SCORE_TTL = 60 * 60  # seconds
+# Scores made without one of the fetches (eg the site was briefly down).
+SCORE_ERROR_TTL = 60  # seconds
+
+# A check's two fetches run at once, on separate connections, and a
+# connection is only kept alive if its page was read to the end (under
+# CONTENT_MAX). So pooling only saves reconnecting for repeat checks of hosts
+# with small pages - enough to cover the hosts checked recently.
+SESSION = shared.make_session(hosts=100)
+
+# A domain's two fetches are made at once, in this pool, and must both finish
+# within FETCH_DEADLINE - they give up when it passes, even if still queued
+# for the pool, so slow sites can't fill it.
+FETCH_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=2 * shared.POOL_MAXSIZE, thread_name_prefix='parked'
+)
+FETCH_DEADLINE = shared.REQ_KWARGS['timeout']  # seconds
+
 
+def _domain_redirects(domain, path='', deadline=None):
+    """Returns whether a domain (and optional path) redirects to another,
+    the domain landed on, the page's text and the number of bytes read.
+
+    Only the first CONTENT_MAX bytes of the page are read, then the
+    connection is closed. Raises requests.exceptions.Timeout if the
+    time.monotonic() deadline passes.
+    """
+    req_kwargs = shared.REQ_KWARGS
+    if deadline is not None:
+        req_kwargs = dict(
+            req_kwargs, timeout=min(req_kwargs['timeout'], _remaining(deadline))
+        )
 
-def _domain_redirects(domain, path=''):
-    """Returns whether a domain (and optional path) redirects to another."""
     idna_domain = domain.to_ascii()
-    req = requests.get(
-        'http://{}/{}'.format(idna_domain, path),
-        **shared.REQ_KWARGS
+    with SESSION.get(
+            'http://{}/{}'.format(idna_domain, path),
+            stream=True,
+            **req_kwargs) as req:
+        content = _read_content(req, deadline)
+        landed_domain = shared.get_domain(req.url)
+        text = _decode(content, req.encoding)
+
+    return landed_domain != idna_domain, landed_domain, text, len(content)
+
+
+def _decode(content, encoding):
+    """Decode page content in its declared encoding, or UTF-8 if it declares
+    none or one that is unknown.
+
+    Unlike requests' Response.text, the encoding of pages declaring none
+    isn't detected - charset detection is slow, and the parked words are
+    ASCII.
+    """
+    try:
+        return content.decode(encoding or 'utf-8', errors='replace')
+    except (LookupError, TypeError):
+        return content.decode('utf-8', errors='replace')
+
+
+def _remaining(deadline):
+    """Return the seconds left until a time.monotonic() deadline, raising
+    requests.exceptions.Timeout if there are none.
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.exceptions.Timeout('Parked check deadline passed')
+    return remaining
+
+
+def _read_content(req, deadline=None):
+    """Return up to CONTENT_MAX bytes of a streamed response's body."""
+    content = bytearray()
+    for chunk in req.iter_content(CHUNK_SIZE):
+        content += chunk
+        if len(content) >= CONTENT_MAX:
+            break
+        if deadline is not None:
+            _remaining(deadline)
+    return bytes(content[:CONTENT_MAX])
+
+
+def _fetch_redirects(domain):
+    """Returns _domain_redirects() for a domain and for its parked check
+    path, fetched concurrently, and whether either missed FETCH_DEADLINE.
+
+    Either result is None if its fetch failed or missed the deadline.
+    """
+    deadline = time.monotonic() + FETCH_DEADLINE
+    futures = (
+        FETCH_POOL.submit(_domain_redirects, domain, '', deadline),
+        FETCH_POOL.submit(
+            _domain_redirects, domain, 'dnstwister_parked_check', deadline
+        ),
     )
-    landed_domain = shared.get_domain(req.url)
-    return landed_domain != idna_domain, landed_domain, req.text[:CONTENT_MAX]
+
+    # The fetches stop themselves at the deadline, within a read.
+    concurrent.futures.wait(futures, timeout=FETCH_DEADLINE * 2)
+
+    results = []
+    timed_out = False
+    for future in futures:
+        if not future.done():
+            future.cancel()
+            results.append(None)
+            timed_out = True
+            continue
+        try:
+            results.append(future.result())
+        except requests.exceptions.Timeout:
+            results.append(None)
+            timed_out = True
+        except requests.exceptions.RequestException:
+            results.append(None)
+
+    return results, timed_out
 
 
 def get_text(score):
@@ -60,18 +174,10 @@ def get_text(score):
 def second_level(domain):
     """Return the second-level bit of a domain.
 
-    Determine tld by finding the longest tld that is the end of the passed in
-    domain.
+    That is the label immediately to the left of the domain's public suffix,
+    as determined by the public suffix list trie in tld_db.
     """
-    domain_str = domain.to_unicode()
-    candidate = ''
-    for tld in tld_db.TLDS:
-        if domain_str.endswith('.' + tld) and len(tld) > len(candidate):
-            candidate = tld
-
-    if candidate != '':
-        return domain_str.rsplit('.' + candidate, 1)[0].split('.')[-1]
-    return ''
+    return tld_db.split_domain(domain.to_unicode())[0].rsplit('.', 1)[-1]
 
 
 def dressed(domain, redirected_domain):
@@ -101,28 +207,54 @@ def get_score(domain):
     """Takes a punt as to whether a domain is parked or not.
 
     Returns a score between 0 and 1 as to the likelihood that the domain is
-    parked. 1 = highly likely.
+    parked. 1 = highly likely. Also returns the score's text, redirection
+    details, the number of page bytes read for the check and whether either
+    fetch missed FETCH_DEADLINE - scored, as before, as a failed fetch.
+
+    Scores are cached for SCORE_TTL, or SCORE_ERROR_TTL if either fetch
+    failed.
+    """
+    idna_domain = domain.to_ascii()
+
+    result = SCORE_CACHE.get(idna_domain)
+    if result is None:
+        result, complete = _get_score(domain)
+        SCORE_CACHE.set(
+            idna_domain,
+            result,
+            ttl=SCORE_TTL if complete else SCORE_ERROR_TTL
+        )
+
+    return result
+
+
+def _get_score(domain):
+    """Returns the uncached score for a domain, as per get_score(), and
+    whether both fetches succeeded.
     """
     score = 0
 
-    try:
-        redirects_domain, landed_domain1, content = _domain_redirects(domain)
-        if redirects_domain:
-            if not dressed(domain, landed_domain1):
-                score += 1
-    except requests.exceptions.RequestException:
+    (domain_fetch, path_fetch), timed_out = _fetch_redirects(domain)
+
+    bytes_read = sum(fetch[3] for fetch in (domain_fetch, path_fetch) if fetch)
+
+    if domain_fetch is not None:
+        redirects_domain, landed_domain1, content, _ = domain_fetch
+    else:
         redirects_domain = False
         landed_domain1 = ''
         content = ''
 
+    dressed_domain = redirects_domain and dressed(domain, landed_domain1)
+    if redirects_domain and not dressed_domain:
+        score += 1
+
     if soft_redirects(content):
         score += 1
 
-    try:
-        redirects_paths, landed_domain2, _ = _domain_redirects(
-            domain, 'dnstwister_parked_check'
-        )
-    except requests.exceptions.RequestException:
+    if path_fetch is not None:
+        redirects_paths, landed_domain2, _, _ = path_fetch
+    else:
         redirects_paths = False
         landed_domain2 = ''
 
@@ -143,10 +275,13 @@ def get_score(domain):
 
     normalised_score = min(1, normalised_score)
 
-    return (
+    result = (
         normalised_score,
         get_text(normalised_score),
         redirects_domain,
-        redirects_domain and dressed(domain, landed_domain1),
+        dressed_domain,
         landed_domain1 if redirects_domain else None,
+        bytes_read,
+        timed_out,
     )
+    return result, domain_fetch is not None and path_fetch is not None
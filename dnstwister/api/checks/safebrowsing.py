@@ -1,11 +1,21 @@
 """Google Safe Browsing API client."""
 import json
 import re
-import requests
+
+from dnstwister.api.checks import shared
+from dnstwister.core.cache import shared_cache
 
 
 API_URL = 'https://www.google.com/transparencyreport/api/v3/safebrowsing/status'
 
+# Reports, by IDNA domain.
+REPORT_CACHE_SIZE = 10000
+REPORT_CACHE = shared_cache('safebrowsing', REPORT_CACHE_SIZE)
+REPORT_TTL = 60 * 60  # seconds
+
+# Every report comes from the one API host.
+SESSION = shared.make_session(hosts=1)
+
 
 def get_report(domain):
     """Returns a Google Safe Browsing API report.
@@ -15,13 +25,26 @@ def get_report(domain):
         https://transparencyreport.google.com/safe-browsing/search
 
     Returns 1 if there's an issue with the domain, 0 if not.
+
+    Reports are cached for REPORT_TTL.
     """
     idna_domain = domain.to_ascii()
+
+    report = REPORT_CACHE.get(idna_domain)
+    if report is None:
+        report = _get_report(idna_domain)
+        REPORT_CACHE.set(idna_domain, report, ttl=REPORT_TTL)
+
+    return report
+
+
+def _get_report(idna_domain):
+    """Returns the uncached report for an IDNA domain."""
     data = {
         'site': idna_domain
     }
 
-    result = requests.get(API_URL, params=data)
+    result = SESSION.get(API_URL, params=data, **shared.REQ_KWARGS)
 
     # Yep, this is gross, the response value is very strangely formatted.
     result_array = re.search(
@@ -1,6 +1,10 @@
 """Shared helpers and settings for the analysis API."""
+import http.cookiejar
 import urllib.parse
 
+import requests
+import requests.adapters
+
 from dnstwister.core.domain import Domain
 
 
@@ -15,6 +19,34 @@ REQ_KWARGS = {
     'timeout': 5,  # seconds
 }
 
+# Kept-alive connections per host, enough for each of the web server's
+# threads to have one.
+POOL_MAXSIZE = 10
+
+
+def make_session(hosts):
+    """Return a requests Session for the checks, pooling kept-alive
+    connections to up to `hosts` hosts.
+
+    The Session is shared by the web server's threads, so it is given the
+    headers in REQ_KWARGS and never stores cookies - nothing about it changes
+    between requests. urllib3's connection pools are thread-safe. Requests
+    must still pass REQ_KWARGS for its timeout.
+    """
+    session = requests.Session()
+    session.headers.update(REQ_KWARGS['headers'])
+    session.cookies.set_policy(
+        http.cookiejar.DefaultCookiePolicy(allowed_domains=[])
+    )
+
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=hosts, pool_maxsize=POOL_MAXSIZE
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
 
 def get_domain(url):
     """Return the domain from a URL."""
@@ -0,0 +1,256 @@
+"""Caches, safe to share between the web server's threads.
+
+Caches made with shared_cache() are held in memory, unless the
+DNSTWISTER_CACHE_DB environment variable names an SQLite database file, in
+which case they are held there and shared by all the processes on the host
+using the same file.
+
+All caches have the same interface: get(key, default=None), set(key, value,
+ttl=None), clear(), len() and stats.
+"""
+import collections
+import logging
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+
+
+# Path to the SQLite database for shared caches, or None to cache in memory.
+CACHE_DB = os.environ.get('DNSTWISTER_CACHE_DB')
+
+# Rows written to an SQLiteCache between prunings of expired and excess rows.
+PRUNE_INTERVAL = 100
+
+
+class LRUCache:
+    """A size-bounded, least-recently-used cache with hit/miss counters.
+
+    Each entry is weighed with `sizeof` (1 per entry by default) and the
+    least recently used entries are evicted to keep the total weight within
+    `max_size`. Entries may also be given a time-to-live in seconds, after
+    which they are treated as missing. Values are shared between callers so
+    should be immutable.
+    """
+    def __init__(self, max_size, sizeof=None, clock=time.monotonic):
+        self._max_size = max_size
+        self._sizeof = sizeof or (lambda value: 1)
+        self._clock = clock
+        self._data = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Return the value for key, or default if not cached."""
+        with self._lock:
+            try:
+                value, size, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires is not None and self._clock() >= expires:
+                del self._data[key]
+                self._size -= size
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Cache a value, evicting older entries as required.
+
+        The value expires after ttl seconds, if given. Values weighing more
+        than the whole cache are not stored.
+        """
+        size = self._sizeof(value)
+        if size > self._max_size:
+            return
+
+        expires = None if ttl is None else self._clock() + ttl
+
+        with self._lock:
+            if key in self._data:
+                self._size -= self._data.pop(key)[1]
+
+            self._data[key] = (value, size, expires)
+            self._size += size
+
+            while self._size > self._max_size:
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._size -= evicted_size
+
+    def clear(self):
+        """Empty the cache and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def stats(self):
+        """Return the cache's counters."""
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'size': self._size,
+                'max_size': self._max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class SQLiteCache:
+    """A size-bounded cache in a table of an SQLite database.
+
+    The database file can be shared by several processes on one host. Values
+    are pickled, so the file must only be writable by the app. Entries may be
+    given a time-to-live in seconds, as with LRUCache, and when the table
+    holds more than `max_size` entries the least recently written are
+    evicted. Hit/miss counters are per-process.
+
+    Database errors (eg a locked database) are logged and treated as cache
+    misses, so a cache problem never fails a request.
+    """
+    def __init__(self, path, name, max_size, clock=time.time):
+        if not re.match(r'^[a-z_]+$', name):
+            raise ValueError(f'Invalid cache name: {name!r}')
+
+        self._path = path
+        self._table = f'cache_{name}'
+        self._max_size = max_size
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self):
+        """Return this thread's connection to the database."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self._path, timeout=5, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {self._table} '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def __len__(self):
+        try:
+            return self._connection().execute(
+                f'SELECT COUNT(*) FROM {self._table}'
+            ).fetchone()[0]
+        except sqlite3.Error as ex:
+            logging.warning('Cache %s unavailable: %s', self._table, ex)
+            return 0
+
+    def get(self, key, default=None):
+        """Return the value for key, or default if not cached."""
+        try:
+            row = self._connection().execute(
+                f'SELECT value, expires FROM {self._table} WHERE key = ?',
+                (key,)
+            ).fetchone()
+        except sqlite3.Error as ex:
+            logging.warning('Cache %s unavailable: %s', self._table, ex)
+            row = None
+
+        with self._lock:
+            if row is None or (row[1] is not None and self._clock() >= row[1]):
+                self.misses += 1
+                return default
+            self.hits += 1
+
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        """Cache a value, expiring after ttl seconds if given.
+
+        Every PRUNE_INTERVAL writes, expired entries are deleted and the
+        least recently written are evicted to bring the table back within
+        max_size.
+        """
+        expires = None if ttl is None else self._clock() + ttl
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_INTERVAL == 0
+
+        try:
+            connection = self._connection()
+
+            # Replacing a row gives it a new rowid, so rowids are in write
+            # order.
+            connection.execute(
+                f'INSERT OR REPLACE INTO {self._table} (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, pickle.dumps(value), expires)
+            )
+
+            if prune:
+                self._prune(connection)
+        except sqlite3.Error as ex:
+            logging.warning('Cache %s unavailable: %s', self._table, ex)
+
+    def _prune(self, connection):
+        """Delete expired entries, then the oldest over max_size."""
+        connection.execute(
+            f'DELETE FROM {self._table} WHERE expires <= ?', (self._clock(),)
+        )
+        connection.execute(
+            f'DELETE FROM {self._table} WHERE rowid IN ('
+            f'SELECT rowid FROM {self._table} ORDER BY rowid LIMIT MAX(0, '
+            f'(SELECT COUNT(*) FROM {self._table}) - ?))',
+            (self._max_size,)
+        )
+
+    def clear(self):
+        """Empty the cache and reset the counters."""
+        try:
+            self._connection().execute(f'DELETE FROM {self._table}')
+        except sqlite3.Error as ex:
+            logging.warning('Cache %s unavailable: %s', self._table, ex)
+
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def stats(self):
+        """Return the cache's counters."""
+        entries = len(self)
+        with self._lock:
+            return {
+                'entries': entries,
+                'size': entries,
+                'max_size': self._max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def shared_cache(name, max_size):
+    """Return a cache, shared between processes if CACHE_DB is set.
+
+    name identifies the cache in the database, so must be unique to each
+    use.
+    """
+    if CACHE_DB:
+        return SQLiteCache(CACHE_DB, name, max_size)
+    return LRUCache(max_size)
@@ -1,4 +1,5 @@
 import binascii
+import functools
 import idna
 import re
 
@@ -8,15 +9,19 @@ VALID_DOMAIN_RE = re.compile(
     flags=re.IGNORECASE
 )
 
+# Number of distinct parsed domains to remember - IDNA conversion is slow and
+# the same domains are constructed over and over while handling a request.
+PARSE_CACHE_SIZE = 100000
+
+
 class Domain:
     def __init__(self, domain):
         """Handle all the possible domain types coming in."""
-        domain_unicode = self._try_parse_to_unicode_domain(domain)
-        if domain_unicode is None:
+        parsed = self._parse(domain)
+        if parsed is None:
             raise InvalidDomainException(f'Invalid domain: {repr(domain)}')
 
-        self._domain_unicode = domain_unicode
-        self._domain_ascii = idna.encode(domain_unicode).decode()
+        self._domain_unicode, self._domain_ascii = parsed
 
     def __str__(self):
         if self.to_unicode() == self.to_ascii():
@@ -27,52 +32,66 @@ class Domain:
         return self.to_ascii()
 
     def __eq__(self, other):
-        other_domain = self._try_parse_to_unicode_domain(other)
-        if other_domain is None:
+        """Domains are equal if their IDNA (ascii) forms are."""
+        if isinstance(other, Domain):
+            return other._domain_ascii == self._domain_ascii
+
+        parsed = self._parse(other)
+        if parsed is None:
             return False
 
-        return Domain(other_domain).to_ascii() == self.to_ascii()
+        return parsed[1] == self._domain_ascii
 
     def __hash__(self):
-        return hash(self._domain_unicode)
+        return hash(self._domain_ascii)
 
     @staticmethod
-    def _try_parse_to_unicode_domain(domain):
-        try:
+    def _parse(domain):
+        """Return the (unicode, ascii) forms of a domain, or None."""
+        if isinstance(domain, Domain):
+            return domain.to_unicode(), domain.to_ascii()
 
-            # If we have a domain object, woo.
-            if isinstance(domain, Domain):
-                return domain.to_unicode()
-
-            # If we have bytes, make it a string.
-            try:
-                domain = domain.decode()
-            except AttributeError:
-                pass
+        try:
+            return _parse_cached(domain)
+        except TypeError:
+            # Unhashable, so definitely not a domain.
+            return
 
-            # If domain is idna already, extract the unicode string.
-            try:
-                un_idna_domain = idna.decode(domain)
-                if un_idna_domain != domain:
-                    domain = un_idna_domain
-            except:
-                pass
+    @classmethod
+    def try_parse(cls, domain):
+        try:
+            return cls(domain)
+        except InvalidDomainException:
+            return
 
-            if len(domain) > 255:
-                return
+    @classmethod
+    def try_parse_with_suffix(cls, name, suffix, suffix_ascii):
+        """Fast try_parse() of name + '.' + suffix, where suffix is from an
+        already-validated domain and suffix_ascii is its IDNA form.
+
+        Only the labels in name are IDNA-encoded and validated, once. Names
+        that IDNA may rewrite (uppercase, or already punycoded) take the
+        normal parsing path.
+        """
+        if name != name.lower() or 'xn--' in name:
+            return cls.try_parse(name + '.' + suffix)
+
+        domain_unicode = name + '.' + suffix
+        if len(domain_unicode) > 255:
+            return
 
-            if VALID_DOMAIN_RE.match(idna.encode(domain).decode()) is None:
-                return
+        try:
+            domain_ascii = idna.encode(name).decode() + '.' + suffix_ascii
+        except UnicodeError:
+            return
 
-            return domain
-        except:
+        if VALID_DOMAIN_RE.match(domain_ascii) is None:
             return
 
-    @classmethod
-    def try_parse(cls, domain):
-        unicode_domain = cls._try_parse_to_unicode_domain(domain)
-        if unicode_domain is not None:
-            return Domain(unicode_domain)
+        domain = cls.__new__(cls)
+        domain._domain_unicode = domain_unicode
+        domain._domain_ascii = domain_ascii
+        return domain
 
     def to_unicode(self):
         return self._domain_unicode
@@ -85,5 +104,39 @@ class Domain:
         return binascii.hexlify(idna_bytes).decode()
 
 
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_cached(domain):
+    """Parse a str or bytes domain to its (unicode, ascii) forms, or None.
+
+    Cached, so repeat parses of the same domain are a dictionary lookup.
+    """
+    try:
+
+        # If we have bytes, make it a string.
+        try:
+            domain = domain.decode()
+        except AttributeError:
+            pass
+
+        # If domain is idna already, extract the unicode string.
+        try:
+            un_idna_domain = idna.decode(domain)
+            if un_idna_domain != domain:
+                domain = un_idna_domain
+        except:
+            pass
+
+        if len(domain) > 255:
+            return
+
+        domain_ascii = idna.encode(domain).decode()
+        if VALID_DOMAIN_RE.match(domain_ascii) is None:
+            return
+
+        return domain, domain_ascii
+    except:
+        return
+
+
 class InvalidDomainException(Exception):
     pass
@@ -26,12 +26,15 @@ __author__ = 'Marcin Ulikowski'
 __version__ = '20180623'
 __email__ = 'marcin@ulikowski.pl'
 
+import collections
+import enum
 import re
 import os.path
 
 import idna
 
 from dnstwister.core.domain import Domain
+from dnstwister.tools import tld_db
 
 
 FILE_TLD = os.path.join(
@@ -44,12 +47,57 @@ DB_TLD = os.path.exists(FILE_TLD)
 if not DB_TLD:
     raise Exception('TLD database is required!')
 
+# Maximum homoglyph results per domain - very long domains can have a huge
+# number of them.
+HOMOGLYPH_BUDGET = 1000
+
+
+class Fuzzer(str, enum.Enum):
+    """ The fuzzers, by display name.
+    """
+    ORIGINAL = 'Original*'
+    ADDITION = 'Addition'
+    BITSQUATTING = 'Bitsquatting'
+    HOMOGLYPH = 'Homoglyph'
+    HYPHENATION = 'Hyphenation'
+    INSERTION = 'Insertion'
+    OMISSION = 'Omission'
+    REPETITION = 'Repetition'
+    REPLACEMENT = 'Replacement'
+    SUBDOMAIN = 'Subdomain'
+    TRANSPOSITION = 'Transposition'
+    VOWEL_SWAP = 'Vowel swap'
+    VARIOUS = 'Various'
+
+    def __str__(self):
+        return self.value
+
+
+class FuzzResult(collections.namedtuple('FuzzResult', ('fuzzer', 'domain'))):
+    """ A single, immutable fuzz result - the Fuzzer that made it and the
+        fuzzed Domain.
+    """
+    __slots__ = ()
+
+    @property
+    def ascii(self):
+        return self.domain.to_ascii()
+
+    @property
+    def unicode(self):
+        return self.domain.to_unicode()
+
+    @property
+    def hex(self):
+        return self.domain.to_hex()
+
 
 class DomainFuzzer(object):
     """ Domain fuzzer.
     """
-    def __init__(self, domain):
+    def __init__(self, domain, homoglyph_budget=HOMOGLYPH_BUDGET):
         self.domain, self.tld = self.__domain_tld(domain)
+        self.homoglyph_budget = homoglyph_budget
         self.domains = []
         self.qwerty = {
         '1': '2q', '2': '3wq1', '3': '4ew2', '4': '5re3', '5': '6tr4', '6': '7yt5', '7': '8uy6', '8': '9iu7', '9': '0oi8', '0': 'po9',
@@ -100,47 +148,36 @@ class DomainFuzzer(object):
         }
 
     def __domain_tld(self, domain):
-        domain = domain.rsplit('.', 2)
-
-        if len(domain) == 2:
-            return domain[0], domain[1]
-
-        if DB_TLD:
-            cc_tld = {}
-            re_tld = re.compile(r'^[a-z]{2,4}\.[a-z]{2}$', re.IGNORECASE)
+        return tld_db.split_domain(domain)
 
-            for line in open(FILE_TLD, 'rb'):
-                line = str(line[:-1], 'utf-8')
-                if re_tld.match(line):
-                    sld, tld = line.split('.')
-                    if not tld in cc_tld:
-                        cc_tld[tld] = []
-                    cc_tld[tld].append(sld)
-
-            sld_tld = cc_tld.get(domain[2])
-            if sld_tld:
-                if domain[1] in sld_tld:
-                    return domain[0], domain[1] + '.' + domain[2]
+    def __filter_domains(self, candidates):
+        seen = set()
 
-        return domain[0] + '.' + domain[1], domain[2]
+        # Candidates mostly keep the original suffix, so only their new
+        # labels need validating and encoding.
+        try:
+            tld_ascii = idna.encode(self.tld).decode()
+        except UnicodeError:
+            tld_ascii = None
+        tld_suffix = '.' + self.tld
 
-    def __filter_domains(self):
-        seen = set()
-        filtered = []
+        for fuzzer, domain_name in candidates:
 
-        for d in self.domains:
+            if tld_ascii is not None and domain_name.endswith(tld_suffix):
+                d_obj = Domain.try_parse_with_suffix(
+                    domain_name[:-len(tld_suffix)], self.tld, tld_ascii
+                )
+            else:
+                d_obj = Domain.try_parse(domain_name)
 
-            d_obj = Domain.try_parse(d['domain-name'])
             if d_obj is None:
                 continue
 
-            if d_obj.to_unicode() in seen:
+            if d_obj in seen:
                 continue
-            seen.add(d_obj.to_unicode())
+            seen.add(d_obj)
 
-            filtered.append(d)
-
-        self.domains = filtered
+            yield FuzzResult(fuzzer, d_obj)
 
     def __bitsquatting(self):
         result = []
@@ -161,28 +198,49 @@ class DomainFuzzer(object):
         return result
 
     def __homoglyph(self):
+        """ Homoglyph substitutions, most plausible first.
+
+            Each result swaps one glyph in for a run of consecutive
+            occurrences of a character - never spanning the whole domain.
+            Results are ranked by the length of that run (single characters
+            first), then by the glyph's position in the glyph table, then by
+            position in the domain, so stopping at the budget keeps the most
+            plausible variants.
+        """
+        positions = {}
+        for i, c in enumerate(self.domain):
+            if self.glyphs.get(c):
+                positions.setdefault(c, []).append(i)
 
-        result = set()
+        if not positions:
+            return []
 
-        for ws in range(0, len(self.domain)):
-            for i in range(0, (len(self.domain)-ws)+1):
-                win = self.domain[i:i+ws]
-
-                j = 0
-                while j < ws:
-                    c = win[j]
-                    if c in self.glyphs:
-                        win_copy = win
-                        for g in self.glyphs[c]:
-                            win = win.replace(c, g)
-                            result.add(self.domain[:i] + win + self.domain[i+ws:])
-                            win = win_copy
-
-                            # Very long domains have terrible complexity when
-                            # ran through this algorithm.
-                            if len(result) >= 1000:
-                                return result
-                    j += 1
+        result = []
+        seen = set()
+        longest_run = max(map(len, positions.values()))
+        glyph_ranks = max(len(self.glyphs[c]) for c in positions)
+
+        for run in range(1, longest_run + 1):
+            runs = sorted(
+                (indexes[k], indexes[k + run - 1], c)
+                for (c, indexes) in positions.items()
+                for k in range(len(indexes) - run + 1)
+                if indexes[k + run - 1] - indexes[k] + 1 < len(self.domain)
+            )
+            for rank in range(glyph_ranks):
+                for (first, last, c) in runs:
+                    if rank >= len(self.glyphs[c]):
+                        continue
+
+                    win = self.domain[first:last+1].replace(c, self.glyphs[c][rank])
+                    domain = self.domain[:first] + win + self.domain[last+1:]
+                    if domain in seen:
+                        continue
+                    seen.add(domain)
+
+                    result.append(domain)
+                    if len(result) >= self.homoglyph_budget:
+                        return result
 
         return result
 
@@ -276,44 +334,51 @@ class DomainFuzzer(object):
 
         return result
 
-    def fuzz(self):
-        """ Perform a domain fuzz.
-        """
-        self.domains.append({ 'fuzzer': 'Original*', 'domain-name': self.domain + '.' + self.tld })
+    def __candidates(self):
+        yield Fuzzer.ORIGINAL, self.domain + '.' + self.tld
 
         for domain in self.__addition():
-            self.domains.append({ 'fuzzer': 'Addition', 'domain-name': domain + '.' + self.tld })
+            yield Fuzzer.ADDITION, domain + '.' + self.tld
         for domain in self.__bitsquatting():
-            self.domains.append({ 'fuzzer': 'Bitsquatting', 'domain-name': domain + '.' + self.tld })
+            yield Fuzzer.BITSQUATTING, domain + '.' + self.tld
         for domain in self.__homoglyph():
-            self.domains.append({ 'fuzzer': 'Homoglyph', 'domain-name': domain + '.' + self.tld })
+            yield Fuzzer.HOMOGLYPH, domain + '.' + self.tld
         for domain in self.__hyphenation():
-            self.domains.append({ 'fuzzer': 'Hyphenation', 'domain-name': domain + '.' + self.tld })
+            yield Fuzzer.HYPHENATION, domain + '.' + self.tld
         for domain in self.__insertion():
-            self.domains.append({ 'fuzzer': 'Insertion', 'domain-name': domain + '.' + self.tld })
+            yield Fuzzer.INSERTION, domain + '.' + self.tld
         for domain in self.__omission():
-            self.domains.append({ 'fuzzer': 'Omission', 'domain-name': domain + '.' + self.tld })
+            yield Fuzzer.OMISSION, domain + '.' + self.tld
         for domain in self.__repetition():
-            self.domains.append({ 'fuzzer': 'Repetition', 'domain-name': domain + '.' + self.tld })
+            yield Fuzzer.REPETITION, domain + '.' + self.tld
         for domain in self.__replacement():
-            self.domains.append({ 'fuzzer': 'Replacement', 'domain-name': domain + '.' + self.tld })
+            yield Fuzzer.REPLACEMENT, domain + '.' + self.tld
         for domain in self.__subdomain():
-            self.domains.append({ 'fuzzer': 'Subdomain', 'domain-name': domain + '.' + self.tld })
+            yield Fuzzer.SUBDOMAIN, domain + '.' + self.tld
         for domain in self.__transposition():
-            self.domains.append({ 'fuzzer': 'Transposition', 'domain-name': domain + '.' + self.tld })
+            yield Fuzzer.TRANSPOSITION, domain + '.' + self.tld
         for domain in self.__vowel_swap():
-            self.domains.append({ 'fuzzer': 'Vowel swap', 'domain-name': domain + '.' + self.tld })
+            yield Fuzzer.VOWEL_SWAP, domain + '.' + self.tld
 
         if not self.domain.startswith('www.'):
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': 'ww' + self.domain + '.' + self.tld })
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': 'www' + self.domain + '.' + self.tld })
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': 'www-' + self.domain + '.' + self.tld })
+            yield Fuzzer.VARIOUS, 'ww' + self.domain + '.' + self.tld
+            yield Fuzzer.VARIOUS, 'www' + self.domain + '.' + self.tld
+            yield Fuzzer.VARIOUS, 'www-' + self.domain + '.' + self.tld
         if '.' in self.tld:
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': self.domain + '.' + self.tld.split('.')[-1] })
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': self.domain + self.tld })
+            yield Fuzzer.VARIOUS, self.domain + '.' + self.tld.split('.')[-1]
+            yield Fuzzer.VARIOUS, self.domain + self.tld
         if '.' not in self.tld:
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': self.domain + self.tld + '.' + self.tld })
+            yield Fuzzer.VARIOUS, self.domain + self.tld + '.' + self.tld
         if self.tld != 'com' and '.' not in self.tld:
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': self.domain + '-' + self.tld + '.com' })
+            yield Fuzzer.VARIOUS, self.domain + '-' + self.tld + '.com'
+
+    def iter_fuzz(self):
+        """ Perform a domain fuzz, yielding each valid, deduplicated
+            FuzzResult as soon as it is generated.
+        """
+        return self.__filter_domains(self.__candidates())
 
-        self.__filter_domains()
+    def fuzz(self):
+        """ Perform a domain fuzz.
+        """
+        self.domains = list(self.iter_fuzz())
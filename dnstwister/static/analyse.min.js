@@ -14,6 +14,9 @@ $(document).ready(function() {
                 if (result.redirects === true && result.dressed !== true) {
                     text += ', redirects to: ' + result.redirects_to;
                 }
+                if (result.timed_out === true) {
+                    text += ', site timed out';
+                }
                 text += ')';
                 success(text);
             }).fail(function() {
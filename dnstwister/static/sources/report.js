@@ -18,47 +18,100 @@ $(document).ready(function() {
         return $(elem).data('hex');
     }).reverse();
 
-    var resolveNext = function(queue) {
+    var unresolved = {};
+    $.map(resolveQueue, function(hex) {
+        unresolved[hex] = true;
+    });
 
-        var hex = queue.pop();
+    var showResult = function(result) {
 
-        if (hex === undefined) {
+        if (!unresolved[result.domain_as_hexadecimal]) {
             return;
         }
+        delete unresolved[result.domain_as_hexadecimal];
 
-        $.getJSON('/api/ip/' + hex, function(result) {
-
-            var elem = $('.resolvable[data-hex=' + hex + ']');
+        var elem = $('.resolvable[data-hex=' + result.domain_as_hexadecimal + ']');
 
-            if (result.ip !== false) {
-                elem.text(result.ip);
-                elem.parent().addClass('resolved');
-                $('.report').show();
-                found += 1;
+        if (result.ip !== false) {
+            elem.text(result.ip);
+            if (result.wildcard === true) {
+                elem.text(result.ip + ' (wildcard)');
+                elem.attr('title', 'Only resolves to a wildcard DNS record, so may not be registered');
+                elem.parent().addClass('wildcard');
             }
-            else if (result.error !== false) {
-                elem.text('Resolution error!');
-                elem.attr('title', 'There was an error resolving this IP');
-                elem.parent().addClass('error');
-                $('.report').show();
-            }
-            else {
-                elem.text('None resolved');
+            elem.parent().addClass('resolved');
+            $('.report').show();
+            found += 1;
+        }
+        else if (result.error !== false) {
+            elem.text('Resolution error!');
+            elem.attr('title', 'There was an error resolving this IP');
+            elem.parent().addClass('error');
+            $('.report').show();
+        }
+        else {
+            elem.text('None resolved');
+        }
+        to_resolve -= 1;
+        $('.resolved_count').text(resolvable - to_resolve);
+    };
+
+    // Resolve in batches, so the first results show quickly.
+    var batchSize = 50;
+
+    var resolveNext = function(queue) {
+
+        var batch = queue.splice(-batchSize, batchSize).reverse();
+
+        if (batch.length === 0) {
+            return;
+        }
+
+        $.ajax({
+            type: 'POST',
+            url: '/api/ip',
+            contentType: 'application/json',
+            data: JSON.stringify({domains_as_hexadecimal: batch}),
+            dataType: 'json',
+            success: function(response) {
+                $.map(response.results, showResult);
+                resolveNext(queue);
             }
-            to_resolve -= 1;
-            $('.resolved_count').text(resolvable - to_resolve);
+        });
+    };
 
-            resolveNext(queue);
+    var resolveInBatches = function() {
 
+        var queue = $.grep(resolveQueue, function(hex) {
+            return unresolved[hex];
+        });
+
+        // 2 "threads"
+        $.map([0, 1], function() {
+            setTimeout(function() {
+                resolveNext(queue);
+            });
         });
     };
 
-    // 5 "threads"
-    $.map([0, 1, 2, 3, 4], function() {
-        setTimeout(function() {
-            resolveNext(resolveQueue);
+    // Stream the results as they are resolved server-side, falling back to
+    // resolving in batches if streaming isn't available or fails part-way.
+    if (window.EventSource) {
+        var source = new EventSource($('.report').data('stream'));
+        source.onmessage = function(event) {
+            showResult(JSON.parse(event.data));
+        };
+        source.addEventListener('done', function() {
+            source.close();
         });
-    });
+        source.onerror = function() {
+            source.close();
+            resolveInBatches();
+        };
+    }
+    else {
+        resolveInBatches();
+    }
 
     var timer = null;
     timer = setInterval(function() {
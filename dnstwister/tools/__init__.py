@@ -1,22 +1,56 @@
 """Generic tools."""
+import atexit
 import binascii
 import os
 import re
 import random
-import socket
 import urllib.parse
 
 import dns.resolver
 import flask
 
+from dnstwister.tools import async_dns
+from dnstwister.tools import dns_cache
 from dnstwister.tools import tld_db
 import dnstwister.dnstwist as dnstwist
+from dnstwister.core.cache import CACHE_DB
+from dnstwister.core.cache import LRUCache
+from dnstwister.core.cache import shared_cache
 from dnstwister.core.domain import Domain
 
 
-RESOLVER = dns.resolver.Resolver()
-RESOLVER.lifetime = 0.5
-RESOLVER.timeout = 0.5
+# Fuzzing is a pure function of the domain, so the results for popular
+# domains are kept - bounded by the total number of FuzzResults held.
+FUZZ_CACHE_SIZE = 250000
+FUZZ_CACHE = LRUCache(FUZZ_CACHE_SIZE, sizeof=len)
+
+# The system's nameservers.
+NAMESERVERS = dns.resolver.Resolver().nameservers
+
+# Resolutions, by IDNA domain, kept for their TTLs (see dns_cache) - in
+# memory, and in the shared cache if there is one. The DNS engine runs on one
+# event loop, so it never waits on the shared cache's database directly.
+RESOLVE_CACHE_SIZE = 100000
+RESOLVE_CACHE = LRUCache(RESOLVE_CACHE_SIZE)
+RESOLVE_SHARED_CACHE = (
+    shared_cache('resolutions', RESOLVE_CACHE_SIZE) if CACHE_DB else None
+)
+
+# All resolution runs on one asyncio engine, with a pool of resolver workers
+# for bulk resolution shared by all requests.
+DNS_POOL_SIZE = 100
+DNS_QUEUE_SIZE = 200
+
+# Don't look up domains in zones known to have wildcard DNS - saves queries,
+# but misses any domains registered in those zones.
+DNS_SKIP_WILDCARDS = False
+
+DNS_ENGINE = async_dns.Engine(
+    NAMESERVERS, size=DNS_POOL_SIZE, queue_size=DNS_QUEUE_SIZE,
+    cache=RESOLVE_CACHE, shared_cache=RESOLVE_SHARED_CACHE,
+    skip_wildcards=DNS_SKIP_WILDCARDS,
+)
+atexit.register(DNS_ENGINE.close)
 
 
 def try_parse_domain_from_hex(hex_encoded_ascii_domain):
@@ -28,26 +62,44 @@ def try_parse_domain_from_hex(hex_encoded_ascii_domain):
     return Domain.try_parse(ascii_domain_text)
 
 
+def iter_fuzzy_domains(domain):
+    """Yield the fuzzy domains, as FuzzResults, as they are generated.
+
+    Results are served from FUZZ_CACHE when available, and cached once fully
+    generated otherwise.
+    """
+    results = FUZZ_CACHE.get(domain.to_ascii())
+    if results is not None:
+        return iter(results)
+    return _fuzz_and_cache(domain)
+
+
+def _fuzz_and_cache(domain):
+    """Yield the fuzzy domains, caching them once all have been yielded."""
+    results = []
+    for result in dnstwist.DomainFuzzer(domain.to_unicode()).iter_fuzz():
+        results.append(result)
+        yield result
+    FUZZ_CACHE.set(domain.to_ascii(), tuple(results))
+
+
 def fuzzy_domains(domain):
-    """Return the fuzzy domains."""
-    fuzzer = dnstwist.DomainFuzzer(domain.to_unicode())
-    fuzzer.fuzz()
-    return list(fuzzer.domains)
+    """Return the fuzzy domains, as an immutable tuple of FuzzResults."""
+    results = FUZZ_CACHE.get(domain.to_ascii())
+    if results is None:
+        results = tuple(dnstwist.DomainFuzzer(domain.to_unicode()).iter_fuzz())
+        FUZZ_CACHE.set(domain.to_ascii(), results)
+    return results
 
 
 def analyse(domain):
-    """Analyse a domain."""
-    data = {'fuzzy_domains': []}
-    results = fuzzy_domains(domain)
+    """Analyse a domain.
 
-    # Add a hex-encoded version of the domain for the later IP resolution. We
-    # do this because the same people who may use this app already have
-    # blocking on things like www.exampl0e.com in URLs...
-    for result in results:
-        result['hex'] = Domain(result['domain-name']).to_hex()
-    data['fuzzy_domains'] = results
-
-    return (domain, data)
+    Each FuzzResult carries a hex-encoded version of the domain for the later
+    IP resolution. We do this because the same people who may use this app
+    already have blocking on things like www.exampl0e.com in URLs...
+    """
+    return (domain, {'fuzzy_domains': fuzzy_domains(domain)})
 
 
 def clean_up_search_term(search_term):
@@ -126,35 +178,34 @@ def resolve(domain):
     Returns and (IP, False) on successful resolution, (False, False) on
     successful failure to resolve and (None, True) on error in attempting to
     resolve.
+
+    See resolve_details().
     """
-    idna_domain = domain.to_ascii()
+    return resolve_details(domain).result
 
-    # Try for an 'A' record.
-    try:
-        ip_addr = str(sorted(RESOLVER.query(idna_domain, 'A'))[0].address)
 
-        # Weird edge case that sometimes happens?!?!
-        if ip_addr != '127.0.0.1':
-            return ip_addr, False
-    except:
-        pass
+def resolve_details(domain, mx=False):
+    """Resolves a domain, returning an async_dns.Resolution with all its
+    addresses (and MX records, if mx).
 
-    # Try for a simple resolution if the 'A' record request failed
-    try:
-        ip_addr = socket.gethostbyname(idna_domain)
-
-        # Weird edge case that sometimes happens?!?!
-        if ip_addr != '127.0.0.1':
-            return ip_addr, False
-    except socket.gaierror:
-        # Indicates failure to resolve to IP address, not an error in
-        # the attempt.
-        return False, False
-    except:
-        pass
-
-    # Error due to exception or 127.0.0.1 issue.
-    return False, True
+    The A and AAAA (and MX) records are queried at once, with one deadline
+    for them all. The Resolution's wildcard is set if the domain only
+    resolved to a wildcard DNS record in its public suffix. Results are served from RESOLVE_CACHE until they expire -
+    including failures and errors, briefly - and concurrent calls for the
+    same domain share a single lookup.
+    """
+    return DNS_ENGINE.resolve_one(domain, mx)
+
+
+def resolve_all(items, key=None, ordered=True, details=False):
+    """Resolve many domains concurrently, without a thread per lookup.
+
+    Yields (item, (ip, error)) in the order of items - or as each resolution
+    completes if not ordered - with the same (ip, error) values as
+    resolve(), or (item, Resolution) as resolve_details() if details. key
+    returns the Domain for each item, defaulting to the item itself.
+    """
+    return DNS_ENGINE.resolve_all(items, key, ordered, details)
 
 
 def random_id(n_bytes=32):
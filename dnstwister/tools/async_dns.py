@@ -0,0 +1,618 @@
+"""Non-blocking bulk DNS resolution.
+
+Resolves domains with raw UDP queries on a single asyncio event loop, running
+in a background thread and shared by the whole process, so thousands of
+fuzzy domains can be resolved concurrently without a thread per lookup.
+
+The loop runs a fixed pool of resolver workers. Each call to
+Engine.resolve_all() gets its own bounded queue, and the workers take from
+the queues in turn so one large export cannot starve the others.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import os
+import socket
+import threading
+
+import dns.exception
+import dns.message
+import dns.rcode
+import dns.rdatatype
+
+from dnstwister.tools import dns_cache
+from dnstwister.tools import tld_db
+
+
+# Number of resolver workers - the maximum resolutions in flight, across all
+# requests.
+POOL_SIZE = 100
+
+# Maximum domains queued, or in flight, for each call to resolve_all().
+QUEUE_SIZE = 200
+
+# Seconds allowed to resolve each domain, across all the queries and
+# nameservers tried.
+TIMEOUT = 1.0
+
+# Longest domain name, in its text form without the trailing dot, that fits
+# in a query.
+MAX_NAME_LENGTH = 253
+
+
+class _QueryProtocol(asyncio.DatagramProtocol):
+    """Hands the response to a single DNS query to a future."""
+    def __init__(self, query, future):
+        self._query = query
+        self._future = future
+
+    def datagram_received(self, data, addr):
+        try:
+            response = dns.message.from_wire(data)
+        except Exception:
+            return
+
+        if self._query.is_response(response) and not self._future.done():
+            self._future.set_result(response)
+
+    def error_received(self, exc):
+        if not self._future.done():
+            self._future.set_exception(exc)
+
+
+async def query(name, rdtype, nameserver, port=53):
+    """Send a single UDP DNS query, returning the response message.
+
+    Waits indefinitely for a response, so callers should apply a deadline.
+    """
+    loop = asyncio.get_event_loop()
+    message = dns.message.make_query(name, rdtype)
+    future = loop.create_future()
+
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _QueryProtocol(message, future),
+        remote_addr=(nameserver, port),
+    )
+    try:
+        transport.sendto(message.to_wire())
+        return await future
+    finally:
+        transport.close()
+
+
+class Resolution(collections.namedtuple('Resolution', (
+        'domain', 'rcode', 'addresses', 'mx', 'elapsed', 'wildcard'),
+        defaults=(False,))):
+    """The result of resolving a domain.
+
+    addresses holds all the domain's A and AAAA record addresses, IPv4
+    first, and mx its (preference, exchange) MX records, or None if they
+    weren't queried. rcode is the name of the response code, or 'TIMEOUT' if
+    the domain couldn't be resolved in time, and elapsed is in seconds.
+    wildcard is set if the addresses are only those of a wildcard DNS record
+    in the domain's public suffix - the domain resolves, but may not be
+    registered.
+    """
+    __slots__ = ()
+
+    @property
+    def result(self):
+        """Return the (ip, error) form of tools.resolve()."""
+        if not self.addresses:
+            return False, self.rcode not in ('NOERROR', 'NXDOMAIN')
+
+        ip_addr = self.addresses[0]
+
+        # Same weird edge case as tools.resolve() always had.
+        if ip_addr == '127.0.0.1':
+            return False, True
+
+        return ip_addr, False
+
+
+def suffix_zone(domain):
+    """Return the IDNA public suffix of a Domain, the zone probed for
+    wildcard DNS.
+
+    Zones within a registrable domain are never probed: a typosquat's owner
+    can give their whole domain wildcard DNS.
+    """
+    labels = tld_db.split_domain(domain.to_unicode())[1].count('.') + 1
+    return '.'.join(domain.to_ascii().split('.')[-labels:])
+
+
+def make_resolution(idna_domain, responses, elapsed):
+    """Combine the responses to a domain's queries into a Resolution.
+
+    responses maps each rdtype queried to its response, or None if there was
+    no response in time.
+    """
+    answered = [response
+                for response
+                in responses.values()
+                if response is not None]
+
+    rdatas = collections.defaultdict(list)
+    for response in answered:
+        for rrset in response.answer:
+            rdatas[rrset.rdtype].extend(rrset)
+
+    addresses = tuple(
+        sorted((rdata.address for rdata in rdatas[dns.rdatatype.A]),
+               key=socket.inet_aton)
+        + sorted((rdata.address for rdata in rdatas[dns.rdatatype.AAAA]),
+                 key=lambda address: socket.inet_pton(socket.AF_INET6, address))
+    )
+
+    mx = None
+    if dns.rdatatype.MX in responses:
+        mx = tuple(sorted(
+            (rdata.preference, rdata.exchange.to_text(omit_final_dot=True))
+            for rdata
+            in rdatas[dns.rdatatype.MX]
+        ))
+
+    rcodes = [response.rcode() for response in answered]
+    if dns.rcode.NXDOMAIN in rcodes:
+        rcode = 'NXDOMAIN'
+    elif addresses:
+        rcode = 'NOERROR'
+    elif len(answered) < len(responses):
+        rcode = 'TIMEOUT'
+    else:
+        rcode = dns.rcode.to_text(max(rcodes))
+
+    return Resolution(idna_domain, rcode, addresses, mx, elapsed)
+
+
+def response_ttl(response):
+    """Return the lowest TTL of the records in a response's answer, or None
+    if it has none.
+    """
+    ttls = [rrset.ttl for rrset in response.answer]
+    if ttls:
+        return min(ttls)
+
+
+class _Batch:
+    """The queue of (domain, future) jobs for one call to resolve_all()."""
+    def __init__(self):
+        self.jobs = collections.deque()
+        self.scheduled = False
+
+
+class Engine:
+    """Resolves domains with a pool of workers on a shared event loop.
+
+    `size` workers resolve domains from the queues of the in-progress calls
+    to resolve_all(), taking one job from each queue in turn. Each queue holds
+    at most `queue_size` domains so callers producing domains faster than they
+    can be resolved are held back.
+
+    Each domain's A and AAAA records are queried at once, and the lookup is
+    given `timeout` seconds in all. Results are cached in `cache`, if given,
+    keyed by IDNA domain and kept for their TTLs (see dns_cache). Concurrent
+    resolutions of the same domain share one lookup.
+
+    `cache` is used on the event loop thread so must not block. A
+    `shared_cache` that may block (an SQLiteCache) can be given as well: it
+    is only read and written in the loop's executor, behind `cache`.
+
+    Each domain's public suffix is probed (once, while cached) for wildcard
+    DNS alongside the lookup and within its deadline, and the domain's
+    Resolution is marked if it only resolved to the wildcard's addresses. If
+    `skip_wildcards` is set, domains under suffixes already known to be
+    wildcarded aren't looked up at all, which saves queries but misses
+    domains registered under those suffixes.
+    """
+    def __init__(self, nameservers, port=53, size=POOL_SIZE,
+                 queue_size=QUEUE_SIZE, timeout=TIMEOUT, cache=None,
+                 shared_cache=None, skip_wildcards=False):
+        self.nameservers = list(nameservers)
+        self.port = port
+        self.size = size
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.cache = cache
+        self.shared_cache = shared_cache
+        self.skip_wildcards = skip_wildcards
+        self._loop = None
+        self._work = None
+        self._workers = []
+        self._lock = threading.Lock()
+
+        # Only touched in the event loop thread.
+        self._batches = collections.deque()
+        self._flights = {}
+        self._closing = False
+
+        # Counters, for stats.
+        self.queued = 0
+        self.in_flight = 0
+        self.resolved = 0
+        self.timeouts = 0
+        self.throttled = 0
+        self.coalesced = 0
+        self.wildcards = 0
+
+    def _start(self):
+        """Start the event loop thread and workers, if not already running."""
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever,
+                name='dnstwister-async-dns',
+                daemon=True,
+            )
+            thread.start()
+
+            async def start_workers():
+                self._work = asyncio.Event()
+                self._workers = [asyncio.ensure_future(self._worker())
+                                 for _
+                                 in range(self.size)]
+
+            asyncio.run_coroutine_threadsafe(start_workers(), loop).result()
+            self._loop = loop
+            return loop
+
+    def close(self):
+        """Stop the workers and the event loop thread."""
+        with self._lock:
+            if self._loop is None:
+                return
+
+            async def stop_workers():
+                self._closing = True
+                for worker in self._workers:
+                    worker.cancel()
+                await asyncio.gather(*self._workers, return_exceptions=True)
+
+            loop, self._loop = self._loop, None
+            asyncio.run_coroutine_threadsafe(stop_workers(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+    def _enqueue(self, batch, domain, future):
+        """Add a job to a batch's queue, scheduling the batch if required."""
+        batch.jobs.append((domain, future))
+        self.queued += 1
+        if not batch.scheduled:
+            batch.scheduled = True
+            self._batches.append(batch)
+        self._work.set()
+
+    def _next_job(self):
+        """Take the next job, round-robin across the batches with jobs."""
+        while self._batches:
+            batch = self._batches.popleft()
+            if batch.jobs:
+                job = batch.jobs.popleft()
+                self.queued -= 1
+                if batch.jobs:
+                    self._batches.append(batch)
+                else:
+                    batch.scheduled = False
+                return job
+            batch.scheduled = False
+
+    async def _worker(self):
+        """Resolve jobs until the loop stops."""
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._work.clear()
+                await self._work.wait()
+                continue
+
+            domain, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            self.in_flight += 1
+            try:
+                result = await self.resolve_details(domain)
+            except BaseException as ex:
+                # Including the CancelledError of a cancelled lookup this job
+                # shared - only the worker's own cancellation ends it.
+                future.set_exception(ex)
+                if self._closing and isinstance(ex, asyncio.CancelledError):
+                    raise
+            else:
+                future.set_result(result)
+            finally:
+                self.in_flight -= 1
+                self.resolved += 1
+
+    async def _query_nameservers(self, idna_domain, rdtype):
+        """Try each nameserver in turn, until one gives an answer.
+
+        Returns the response - the last nameserver's if none gave an answer -
+        or None if none responded. A query that can't be made or whose
+        response is malformed counts as no response.
+        """
+        response = None
+        for nameserver in self.nameservers:
+            try:
+                response = await query(
+                    idna_domain, rdtype, nameserver, self.port
+                )
+            except (OSError, dns.exception.DNSException):
+                continue
+
+            if response.rcode() in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+                break
+
+        return response
+
+    async def _lookup(self, idna_domain, mx):
+        """Query an IDNA domain's A and AAAA (and MX if mx) records at once,
+        within the timeout.
+
+        Returns the Resolution and the TTL of its records, or None if not
+        known. An NXDOMAIN response ends the lookup straight away.
+        """
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        rdtypes = (dns.rdatatype.A, dns.rdatatype.AAAA)
+        if mx:
+            rdtypes += (dns.rdatatype.MX,)
+
+        tasks = {
+            asyncio.ensure_future(self._query_nameservers(idna_domain, rdtype)): rdtype
+            for rdtype
+            in rdtypes
+        }
+        responses = dict.fromkeys(rdtypes)
+
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = started + self.timeout - loop.time()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    break
+
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    responses[tasks[task]] = task.result()
+
+                if any(response is not None
+                       and response.rcode() == dns.rcode.NXDOMAIN
+                       for response
+                       in responses.values()):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        resolution = make_resolution(
+            idna_domain, responses, loop.time() - started
+        )
+
+        ttls = [response_ttl(response)
+                for response
+                in responses.values()
+                if response is not None]
+        ttls = [ttl for ttl in ttls if ttl is not None]
+
+        return resolution, min(ttls) if ttls else None
+
+    async def _cached(self, key, lookup):
+        """Return the cached value for key, or the result of awaiting
+        lookup() - shared with any concurrent calls for key.
+
+        lookup returns the value and the seconds to cache it for. Values
+        found in the shared cache are kept in memory for MIN_TTL.
+        """
+        if self.cache is not None:
+            value = self.cache.get(key)
+            if value is not None:
+                return value
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(flight)
+
+        flight = asyncio.get_event_loop().create_future()
+        self._flights[key] = flight
+        try:
+            value = await self._shared_get(key)
+            if value is not None:
+                ttl = dns_cache.MIN_TTL
+            else:
+                value, ttl = await lookup()
+                self._shared_set(key, value, ttl)
+
+            if self.cache is not None:
+                self.cache.set(key, value, ttl=ttl)
+            flight.set_result(value)
+            return value
+        except Exception as ex:
+            # Concurrent calls get the same error. Mark it retrieved, as
+            # there may be none.
+            flight.set_exception(ex)
+            flight.exception()
+            raise
+        finally:
+            del self._flights[key]
+            if not flight.done():
+                flight.cancel()
+
+    async def _shared_get(self, key):
+        """Return the value for key in the shared cache, if any."""
+        if self.shared_cache is None:
+            return None
+        return await asyncio.get_event_loop().run_in_executor(
+            None, self.shared_cache.get, key
+        )
+
+    def _shared_set(self, key, value, ttl):
+        """Cache a value in the shared cache, if any, without waiting."""
+        if self.shared_cache is None:
+            return
+        asyncio.get_event_loop().run_in_executor(
+            None, functools.partial(self.shared_cache.set, key, value, ttl=ttl)
+        )
+
+    async def _wildcard_addresses(self, zone):
+        """Return the addresses a zone's wildcard DNS record resolves to, if
+        it has one, by resolving a random name in the zone.
+
+        Zones are public suffixes, see suffix_zone().
+        """
+        async def probe():
+            name = 'dnstwister-{}.{}'.format(os.urandom(6).hex(), zone)
+            if len(name) > MAX_NAME_LENGTH:
+                return (), dns_cache.WILDCARD_TTL
+            resolution, _ = await self._lookup(name, mx=False)
+            return resolution.addresses, dns_cache.WILDCARD_TTL
+
+        return await self._cached(zone + ' *', probe)
+
+    async def resolve_details(self, domain, mx=False):
+        """Resolve a Domain, returning a Resolution."""
+        idna_domain = domain.to_ascii()
+        zone = suffix_zone(domain)
+
+        if self.skip_wildcards and self.cache is not None:
+            wildcard_addresses = self.cache.get(zone + ' *')
+            if wildcard_addresses:
+                self.wildcards += 1
+                return Resolution(
+                    idna_domain, 'NOERROR', wildcard_addresses, None, 0.0,
+                    wildcard=True,
+                )
+
+        async def lookup():
+            loop = asyncio.get_event_loop()
+            deadline = loop.time() + self.timeout
+
+            # The probe shares the lookup's deadline. If it misses it, it is
+            # left to finish and be cached for the domains that follow.
+            probe = asyncio.ensure_future(self._wildcard_addresses(zone))
+            probe.add_done_callback(
+                lambda task: task.cancelled() or task.exception()
+            )
+
+            resolution, record_ttl = await self._lookup(idna_domain, mx)
+            ttl = dns_cache.result_ttl(resolution.result, record_ttl)
+
+            if resolution.addresses:
+                await asyncio.wait(
+                    {probe}, timeout=max(0, deadline - loop.time())
+                )
+                if (probe.done() and not probe.cancelled()
+                        and probe.exception() is None
+                        and probe.result()
+                        and set(resolution.addresses) <= set(probe.result())):
+                    self.wildcards += 1
+                    resolution = resolution._replace(wildcard=True)
+
+            return resolution, ttl
+
+        key = idna_domain + ' MX' if mx else idna_domain
+        return await self._cached(key, lookup)
+
+    async def resolve(self, domain):
+        """Resolve a Domain, returning the (ip, error) of tools.resolve()."""
+        resolution = await self.resolve_details(domain)
+        return resolution.result
+
+    def resolve_one(self, domain, mx=False):
+        """Resolve a Domain from outside the event loop, returning a
+        Resolution.
+        """
+        loop = self._start()
+        return asyncio.run_coroutine_threadsafe(
+            self.resolve_details(domain, mx), loop
+        ).result()
+
+    def resolve_all(self, items, key=None, ordered=True, details=False):
+        """Resolve many domains concurrently.
+
+        Yields (item, (ip, error)) - or (item, Resolution) if details - in
+        the order of items, or as each resolution completes if not ordered.
+        Items are taken from items, and queued for resolution, only while
+        fewer than queue_size are outstanding, so items can be a (lazy)
+        generator. key returns the Domain for each item, defaulting to the
+        item itself.
+        """
+        loop = self._start()
+        key = key or (lambda item: item)
+        batch = _Batch()
+        pending = collections.OrderedDict()
+
+        def result(future):
+            resolution = future.result()
+            return resolution if details else resolution.result
+
+        def take_completed(throttled):
+            """Take the next result(s), waiting for them if required.
+
+            Waits are counted in self.throttled if the caller is throttled -
+            waiting for room in the queue.
+            """
+            if ordered:
+                future, item = pending.popitem(last=False)
+                if throttled and not future.done():
+                    self.throttled += 1
+                return [(item, result(future))]
+
+            done, _ = concurrent.futures.wait(pending, timeout=0)
+            if not done:
+                if throttled:
+                    self.throttled += 1
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+            return [(pending.pop(future), result(future))
+                    for future
+                    in done]
+
+        try:
+            for item in items:
+                future = concurrent.futures.Future()
+                loop.call_soon_threadsafe(
+                    self._enqueue, batch, key(item), future
+                )
+                pending[future] = item
+
+                if len(pending) >= self.queue_size:
+                    yield from take_completed(throttled=True)
+
+            while pending:
+                yield from take_completed(throttled=False)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @property
+    def stats(self):
+        """Return the pool's counters.
+
+        A growing 'queued' with 'in_flight' at 'size' means the pool is
+        saturated, and 'throttled' counts the times a caller had to wait for
+        room in its queue. 'coalesced' counts resolutions that shared another's
+        lookup, and 'wildcards' those only resolving to a wildcard in their
+        public suffix.
+        """
+        return {
+            'size': self.size,
+            'queue_size': self.queue_size,
+            'requests': len(self._batches),
+            'queued': self.queued,
+            'in_flight': self.in_flight,
+            'resolved': self.resolved,
+            'timeouts': self.timeouts,
+            'throttled': self.throttled,
+            'coalesced': self.coalesced,
+            'wildcards': self.wildcards,
+        }
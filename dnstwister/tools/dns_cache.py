@@ -0,0 +1,40 @@
+"""How long to cache domain resolution results.
+
+Successful resolutions are cached for their record's TTL, within bounds, and
+failures for a shorter fixed time so newly registered domains show up soon.
+"""
+
+
+# Bounds on the time a successful resolution is cached, in seconds.
+MIN_TTL = 30
+MAX_TTL = 3600
+
+# Time a successful resolution is cached when the record TTL is unknown, in
+# seconds.
+DEFAULT_TTL = 300
+
+# Time a domain not resolving (NXDOMAIN, or no 'A' records) is cached, in
+# seconds.
+NEGATIVE_TTL = 60
+
+# Time an error in resolving is cached, in seconds.
+ERROR_TTL = 10
+
+# Time the result of probing a zone for wildcard DNS is cached, in seconds.
+WILDCARD_TTL = 3600
+
+
+def result_ttl(result, record_ttl=None):
+    """Return the seconds to cache an (ip, error) resolution result for."""
+    ip_addr, error = result
+
+    if error:
+        return ERROR_TTL
+
+    if not ip_addr:
+        return NEGATIVE_TTL
+
+    if record_ttl is None:
+        return DEFAULT_TTL
+
+    return min(max(record_ttl, MIN_TTL), MAX_TTL)
@@ -1,12 +1,25 @@
 """Interface to the top-level-domains database in dnstwister.
 
-It's small so we hold it in memory as a set.
+It's small so we hold it in memory as a set, alongside a reversed-label trie
+of the full public suffix list (wildcard and exception rules included) used
+to split domains into their registrable part and public suffix. Both are
+built once, at import, and shared by the whole process.
 """
 import os
 
 
 TLDS = set()
 
+# The public suffix list as a trie of reversed labels, for example the rules
+# 'uk', 'co.uk', '*.ck' and '!www.ck' become:
+#
+#   {'uk': {RULE: True, 'co': {RULE: True}},
+#    'ck': {'*': {RULE: True}, '!www': {RULE: True}}}
+SUFFIX_TRIE = {}
+
+# Marks a node as the end of a rule - '.' can never be a label.
+RULE = '.'
+
 DB_PATH = os.path.join(
     'dnstwister',
     'dnstwist',
@@ -29,5 +42,68 @@ def valid_tld(line):
     return True
 
 
+def add_rule(rule):
+    """Add a public suffix list rule to the trie."""
+    node = SUFFIX_TRIE
+    for label in reversed(rule.lower().split('.')):
+        node = node.setdefault(label, {})
+    node[RULE] = True
+
+
+def suffix_length(labels):
+    """Return how many of the trailing labels make up the public suffix.
+
+    Follows the public suffix list algorithm: the longest matching rule wins,
+    exception rules ('!www.ck') beat wildcards ('*.ck') and an unlisted TLD
+    is a suffix on its own. A label can match both a wildcard and an
+    explicit child (for example 'co' under '*.il' and 'blogspot.co.il'), so
+    every matching branch is walked. The cost depends only on the number of
+    labels.
+    """
+    nodes = [SUFFIX_TRIE]
+    length = 1
+    for depth, label in enumerate(reversed(labels), 1):
+        label = label.lower()
+        if any('!' + label in node for node in nodes):
+            return depth - 1
+
+        nodes = [
+            child
+            for node in nodes
+            for child in (node.get(label), node.get('*'))
+            if child is not None
+        ]
+        if not nodes:
+            break
+
+        if any(RULE in node for node in nodes):
+            length = depth
+
+    return length
+
+
+def split_domain(domain):
+    """Split a domain into the part to fuzz and its public suffix.
+
+    At least one label is always left to fuzz, for example:
+
+        www.example.com -> ('www.example', 'com')
+        example.co.uk -> ('example', 'co.uk')
+        www.ck -> ('www', 'ck')
+        co.uk -> ('co', 'uk')
+    """
+    labels = domain.split('.')
+    length = min(suffix_length(labels), len(labels) - 1)
+    return '.'.join(labels[:-length]), '.'.join(labels[-length:])
+
+
 with open(DB_PATH, 'rb') as tldf:
-    TLDS.update(filter(valid_tld, tldf.read().decode('utf-8').split('\n')))
+    lines = tldf.read().decode('utf-8').split('\n')
+
+TLDS.update(filter(valid_tld, lines))
+
+for line in lines:
+    line = line.strip()
+    if line.startswith('//') or line == '':
+        continue
+    add_rule(line.split()[0])
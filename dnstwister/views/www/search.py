@@ -1,7 +1,11 @@
 """Search/report page."""
 import binascii
-import concurrent.futures
+import csv
+import io
 import json
+import operator
+import textwrap
+import zlib
 
 import flask
 
@@ -10,51 +14,79 @@ import dnstwister.tools as tools
 from dnstwister.core.domain import Domain
 
 
+# Characters of CSV export buffered before sending.
+CSV_CHUNK_SIZE = 16 * 1024
+
+
 def html_render(domain):
     """Render and return the html report."""
     return flask.render_template(
         'www/report.html',
         domain=domain,
         report=tools.analyse(domain)[1],
-        exports={'json': 'json', 'csv': 'csv'}
+        exports={
+            'json': 'json',
+            'ndjson': 'ndjson',
+            'csv': 'csv',
+            'csv.gz': 'csv.gz',
+            'tsv': 'tsv',
+        }
     )
 
 
+def json_result(result, resolution):
+    """Return the JSON-serialisable form of a FuzzResult and its
+    async_dns.Resolution.
+    """
+    ip_addr, error = resolution.result
+    return {
+        'domain-name': result.ascii,
+        'fuzzer': result.fuzzer,
+        'hex': result.hex,
+        'resolution': {
+            'error': error,
+            'ip': ip_addr,
+            'wildcard': resolution.wildcard,
+        }
+    }
+
+
 def json_render(domain):
-    """Render and return the json-formatted report."""
-    json_filename = 'dnstwister_report_{}.json'.format(domain.to_ascii())
+    """Render and return the json-formatted report.
 
-    def local_resolve_candidate(candidate):
-        domain = Domain(candidate['domain-name'])
-        ip_addr, error = tools.resolve(domain)
-        return candidate['fuzzer'], domain, ip_addr, error
+    The report is streamed, a fuzzy domain at a time in report order, and is
+    identical to json.dumps(report, sort_keys=True, indent=4).
+    """
+    json_filename = 'dnstwister_report_{}.json'.format(domain.to_ascii())
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-        futures = executor.map(
-            local_resolve_candidate,
-            tools.analyse(domain)[1]['fuzzy_domains']
+    def chunks():
+        # Resolution starts on the first candidate while the rest are
+        # generated.
+        resolutions = tools.resolve_all(
+            tools.iter_fuzzy_domains(domain),
+            key=operator.attrgetter('domain'),
+            details=True,
         )
 
-    results = []
-    for (fuzzer, entry_domain, ip_addr, error) in futures:
-        results.append({
-            'domain-name': entry_domain.to_ascii(),
-            'fuzzer': fuzzer,
-            'hex': entry_domain.to_hex(),
-            'resolution': {
-                'error': error,
-                'ip': ip_addr
-            }
-        })
+        opening = '{{\n    {}: {{\n        "fuzzy_domains": ['.format(
+            json.dumps(domain.to_ascii())
+        )
+        separator = opening + '\n'
+        for (result, resolution) in resolutions:
+            result_json = json.dumps(
+                json_result(result, resolution),
+                sort_keys=True, indent=4, separators=(',', ': ')
+            )
+            yield separator + textwrap.indent(result_json, ' ' * 12)
+            separator = ',\n'
 
-    response = {
-        domain.to_ascii(): {
-            'fuzzy_domains': results
-        }
-    }
+        if separator == ',\n':
+            yield '\n        ]\n    }\n}'
+        else:
+            yield opening + ']\n    }\n}'
 
     return flask.Response(
-        json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')),
+        chunks(),
         headers={
             'Content-Disposition': 'attachment; filename=' + json_filename
         },
@@ -62,35 +94,141 @@ def json_render(domain):
     )
 
 
-def csv_render(domain):
-    """Render and return the csv-formatted report."""
-    headers = ('Domain', 'Type', 'Tweak', 'IP', 'Error')
-    csv_filename = 'dnstwister_report_{}.csv'.format(domain.to_ascii())
+def ndjson_render(domain):
+    """Render and return the report as newline-delimited JSON, streamed.
 
-    def local_resolve_candidate(candidate):
-        domain = Domain(candidate['domain-name'])
-        ip_addr, error = tools.resolve(domain)
-        return candidate['fuzzer'], domain, ip_addr, error
+    Each line is a compact JSON object for a fuzzy domain, as in the json
+    report's "fuzzy_domains", in the order they are resolved.
+    """
+    ndjson_filename = 'dnstwister_report_{}.ndjson'.format(domain.to_ascii())
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-        futures = executor.map(
-            local_resolve_candidate,
-            tools.analyse(domain)[1]['fuzzy_domains']
+    def lines():
+        resolutions = tools.resolve_all(
+            tools.iter_fuzzy_domains(domain),
+            key=operator.attrgetter('domain'),
+            ordered=False,
+            details=True,
         )
 
-    csv = ','.join(headers) + '\n'
-    for (fuzzer, entry_domain, ip_addr, error) in futures:
-        row = (
+        for (result, resolution) in resolutions:
+            yield json.dumps(
+                json_result(result, resolution),
+                sort_keys=True, separators=(',', ':')
+            ) + '\n'
+
+    return flask.Response(
+        lines(),
+        headers={
+            'Content-Disposition': 'attachment; filename=' + ndjson_filename
+        },
+        mimetype='application/x-ndjson',
+    )
+
+
+def stream_render(domain):
+    """Stream the resolution of the fuzzy domains as server-sent events.
+
+    Each event's data is a JSON result, sent as soon as its domain is
+    resolved - so not in report order. A final "done" event is sent once
+    all are resolved.
+    """
+    def events():
+        resolutions = tools.resolve_all(
+            tools.iter_fuzzy_domains(domain),
+            key=operator.attrgetter('domain'),
+            ordered=False,
+            details=True,
+        )
+
+        for (result, resolution) in resolutions:
+            ip_addr, error = resolution.result
+            data = json.dumps({
+                'domain': result.ascii,
+                'domain_as_hexadecimal': result.hex,
+                'fuzzer': result.fuzzer,
+                'ip': ip_addr,
+                'error': error,
+                'wildcard': resolution.wildcard,
+            })
+            yield 'data: {}\n\n'.format(data)
+
+        yield 'event: done\ndata: {}\n\n'
+
+    return flask.Response(
+        events(),
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        },
+        mimetype='text/event-stream',
+    )
+
+
+def csv_chunks(domain, delimiter=','):
+    """Yield the csv-formatted report, in CSV_CHUNK_SIZE-ish chunks.
+
+    Rows are in the order the fuzzy domains are resolved. Wildcard is True
+    for domains only resolving to a wildcard DNS record in their public
+    suffix.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator='\n')
+    writer.writerow(('Domain', 'Type', 'Tweak', 'IP', 'Error', 'Wildcard'))
+
+    resolutions = tools.resolve_all(
+        tools.iter_fuzzy_domains(domain),
+        key=operator.attrgetter('domain'),
+        ordered=False,
+        details=True,
+    )
+
+    for (result, resolution) in resolutions:
+        ip_addr, error = resolution.result
+        writer.writerow((
             domain.to_ascii(),
-            fuzzer,
-            entry_domain.to_ascii(),
+            result.fuzzer,
+            result.ascii,
             str(ip_addr),
             str(error),
+            str(resolution.wildcard),
+        ))
+
+        if buffer.tell() >= CSV_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Gzip-compress a stream of text chunks."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_render(domain, compress=False):
+    """Render and return the csv-formatted report, streamed.
+
+    If compress is set the report is gzip-compressed.
+    """
+    csv_filename = 'dnstwister_report_{}.csv'.format(domain.to_ascii())
+
+    if compress:
+        return flask.Response(
+            gzip_chunks(csv_chunks(domain)),
+            headers={
+                'Content-Disposition': 'attachment; filename=' + csv_filename + '.gz'
+            },
+            mimetype='application/gzip',
         )
-        csv += ','.join(row) + '\n'
 
     return flask.Response(
-        csv,
+        csv_chunks(domain),
         headers={
             'Content-Disposition': 'attachment; filename=' + csv_filename
         },
@@ -98,6 +236,19 @@ def csv_render(domain):
     )
 
 
+def tsv_render(domain):
+    """Render and return the tsv-formatted report, streamed."""
+    tsv_filename = 'dnstwister_report_{}.tsv'.format(domain.to_ascii())
+
+    return flask.Response(
+        csv_chunks(domain, delimiter='\t'),
+        headers={
+            'Content-Disposition': 'attachment; filename=' + tsv_filename
+        },
+        mimetype='text/tab-separated-values',
+    )
+
+
 @app.route('/search', methods=['POST'])
 def search_post():
     """Handle form submit."""
@@ -166,5 +317,13 @@ def search(search_domain, fmt=None):
         return json_render(domain)
     elif fmt == 'csv':
         return csv_render(domain)
+    elif fmt == 'csv.gz':
+        return csv_render(domain, compress=True)
+    elif fmt == 'ndjson':
+        return ndjson_render(domain)
+    elif fmt == 'tsv':
+        return tsv_render(domain)
+    elif fmt == 'stream':
+        return stream_render(domain)
     else:
         flask.abort(400, 'Unknown export format: {}'.format(fmt))
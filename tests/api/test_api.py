@@ -15,13 +15,33 @@ def test_api_root(webapp):
         'domain_fuzzer_url': 'http://localhost/api/fuzz/{domain_as_hexadecimal}',
         'domain_to_hexadecimal_url': 'http://localhost/api/to_hex/{domain}',
         'ip_resolution_url': 'http://localhost/api/ip/{domain_as_hexadecimal}',
+        'ip_batch_resolution_url': 'http://localhost/api/ip',
         'parked_check_url': 'http://localhost/api/parked/{domain_as_hexadecimal}',
         'google_safe_browsing_url': 'http://localhost/api/safebrowsing/{domain_as_hexadecimal}',
         'whois_url': 'http://localhost/api/whois/{domain_as_hexadecimal}',
+        'stats_url': 'http://localhost/api/stats',
         'url': 'http://localhost/api/',
     }
 
 
+def test_api_stats(webapp):
+    """The engine and cache counters are reported."""
+    webapp.get('/api/fuzz/{}'.format(Domain('example.com').to_hex()))
+    webapp.get('/api/fuzz/{}'.format(Domain('example.com').to_hex()))
+
+    payload = webapp.get('/api/stats').json
+
+    assert payload['url'] == 'http://localhost/api/stats'
+    assert payload['dns_engine']['size'] == tools.DNS_POOL_SIZE
+    assert payload['dns_engine']['queued'] == 0
+    assert sorted(payload['caches']) == [
+        'fuzz', 'parked', 'resolutions', 'safebrowsing', 'shared_resolutions',
+        'whois',
+    ]
+    assert payload['caches']['fuzz']['hits'] == 1
+    assert payload['caches']['fuzz']['misses'] == 1
+
+
 def test_api_root_redirect(webapp):
     """Test the /api -> /api/ redirect."""
     request = webapp.get('/api')
@@ -0,0 +1,72 @@
+"""The API's batch IP resolution endpoint."""
+import pytest
+import webtest.app
+
+from dnstwister.core.domain import Domain
+from dnstwister.tools.async_dns import Resolution
+
+
+def fake_resolve_all(items, key=None, details=False):
+    """Resolve everything to the same, impossible, IP address - the second
+    domain only by wildcard DNS.
+    """
+    for i, item in enumerate(items):
+        yield item, Resolution(
+            item.to_ascii(), 'NOERROR', ('999.999.999.999',), None, 0.01,
+            wildcard=i == 1,
+        )
+
+
+def test_resolves_domains_in_order(webapp, monkeypatch):
+    monkeypatch.setattr('dnstwister.tools.resolve_all', fake_resolve_all)
+    domains = [Domain('www.example.com'), Domain('xn--sterreich-z7a.icom.museum')]
+
+    response = webapp.post_json('/api/ip', {
+        'domains_as_hexadecimal': [domain.to_hex() for domain in domains],
+    })
+
+    assert response.json == {
+        'url': 'http://localhost/api/ip',
+        'results': [{
+            'domain': 'www.example.com',
+            'domain_as_hexadecimal': '7777772e6578616d706c652e636f6d',
+            'ip': '999.999.999.999',
+            'error': False,
+            'wildcard': False,
+        }, {
+            'domain': 'xn--sterreich-z7a.icom.museum',
+            'domain_as_hexadecimal': domains[1].to_hex(),
+            'ip': '999.999.999.999',
+            'error': False,
+            'wildcard': True,
+        }],
+    }
+
+
+def test_resolves_nothing(webapp):
+    response = webapp.post_json('/api/ip', {'domains_as_hexadecimal': []})
+
+    assert response.json['results'] == []
+
+
+@pytest.mark.parametrize('body', [
+    None,
+    {},
+    {'domains_as_hexadecimal': 'abcd'},
+    {'domains_as_hexadecimal': [1234]},
+    {'domains_as_hexadecimal': ['6578616d706c65']},  # 'example'
+    {'domains_as_hexadecimal': ['not hex']},
+])
+def test_malformed_requests(webapp, body):
+    with pytest.raises(webtest.app.AppError) as err:
+        webapp.post_json('/api/ip', body)
+    assert '400 BAD REQUEST' in str(err)
+
+
+def test_batch_size_is_limited(webapp, monkeypatch):
+    monkeypatch.setattr('dnstwister.api.IP_BATCH_MAX', 2)
+    hexdomain = Domain('www.example.com').to_hex()
+
+    with pytest.raises(webtest.app.AppError) as err:
+        webapp.post_json('/api/ip', {'domains_as_hexadecimal': [hexdomain] * 3})
+    assert '400 BAD REQUEST' in str(err)
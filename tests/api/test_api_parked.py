@@ -1,5 +1,13 @@
 """The API's parked checker endpoint."""
+import http.server
+import threading
+import time
+
+import pytest
+import requests
+
 import dnstwister.api.checks.parked as parked_api
+from dnstwister.core.cache import LRUCache
 from dnstwister.core.domain import Domain
 
 
@@ -23,6 +31,8 @@ def test_not_parked(f_httpretty, webapp):
     assert response['score_text'] == 'Unlikely'
     assert not response['redirects']
     assert response['redirects_to'] is None
+    assert response['bytes_read'] == 4
+    assert response['timed_out'] is False
 
 
 def test_parked(f_httpretty, webapp):
@@ -98,6 +108,8 @@ def test_second_level_extraction():
     assert parked_api.second_level(Domain('www.example.com')) == 'example'
     assert parked_api.second_level(Domain('example.com')) == 'example'
     assert parked_api.second_level(Domain('www2.example.co.uk')) == 'example'
+    assert parked_api.second_level(Domain('www.example.co.ck')) == 'example'
+    assert parked_api.second_level(Domain('www.ck')) == 'www'
 
 
 def test_dressed_check():
@@ -108,3 +120,221 @@ def test_dressed_check():
     assert parked_api.dressed(Domain('www.example.com'), Domain('example.com.au'))
 
     assert not parked_api.dressed(Domain('www.example.com'), Domain('www.examples.com'))
+
+
+def test_scores_are_cached(f_httpretty, webapp):
+    """Repeated checks of a domain don't refetch it."""
+    f_httpretty.register_uri(
+        f_httpretty.GET, 'http://www.example.com:80/',
+        body=lambda request, uri, headers: (200, {}, 'OK'),
+    )
+    f_httpretty.register_uri(
+        f_httpretty.GET, 'http://www.example.com:80/dnstwister_parked_check',
+        body=lambda request, uri, headers: (200, {}, 'OK'),
+    )
+
+    hexdomain = Domain('www.example.com').to_hex()
+
+    first = webapp.get('/api/parked/{}'.format(hexdomain)).json
+    requests_made = len(f_httpretty.latest_requests())
+    second = webapp.get('/api/parked/{}'.format(hexdomain)).json
+
+    assert first == second
+    assert len(f_httpretty.latest_requests()) == requests_made
+    assert parked_api.SCORE_CACHE.stats['hits'] == 1
+
+
+def test_session_does_not_keep_cookies(f_httpretty):
+    """The shared session carries nothing from one site to the next."""
+    f_httpretty.register_uri(
+        f_httpretty.GET, 'http://www.example.com:80/',
+        body=lambda request, uri, headers: (
+            200, {'Set-Cookie': 'visitor=1; Path=/'}, 'OK'
+        ),
+    )
+
+    parked_api.SESSION.get('http://www.example.com/')
+    parked_api.SESSION.get('http://www.example.com/')
+
+    assert len(parked_api.SESSION.cookies) == 0
+    assert 'Cookie' not in f_httpretty.last_request().headers
+    assert f_httpretty.last_request().headers['User-Agent'].startswith(
+        'Mozilla/5.0'
+    )
+
+
+@pytest.yield_fixture
+def local_sites(monkeypatch):
+    """Proxy the parked check's fetches to a local HTTP server that answers
+    every request with 'OK', after `delay` seconds - or, if `endless` is
+    set, with a page that never ends.
+    """
+    class Handler(http.server.BaseHTTPRequestHandler):
+        delay = 0
+        endless = False
+
+        def do_GET(self):
+            time.sleep(self.delay)
+            self.send_response(200)
+            if not self.endless:
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'OK')
+                return
+
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            try:
+                while True:
+                    self.wfile.write(b'for sale ' * 1024)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(parked_api.SESSION, 'proxies', {
+        'http': 'http://127.0.0.1:{}'.format(server.server_address[1]),
+    })
+
+    yield Handler
+
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_fetches_are_concurrent(local_sites):
+    local_sites.delay = 0.5
+
+    start = time.monotonic()
+    score = parked_api.get_score(Domain('www.example.com'))
+    elapsed = time.monotonic() - start
+
+    assert score[:3] == (0.0, 'Unlikely', False)
+    assert elapsed < 0.9
+
+
+def test_fetches_share_a_deadline(local_sites, monkeypatch):
+    """Fetches not finished by the deadline are scored as failed, and
+    reported.
+    """
+    local_sites.delay = 1
+    monkeypatch.setattr(parked_api, 'FETCH_DEADLINE', 0.2)
+
+    start = time.monotonic()
+    score = parked_api.get_score(Domain('www.example.com'))
+    elapsed = time.monotonic() - start
+
+    assert score == (0.0, 'Unlikely', False, False, None, 0, True)
+    assert elapsed < 0.9
+
+
+def test_slow_sites_do_not_fill_the_fetch_pool(local_sites, monkeypatch):
+    """Fetches stop at their deadline, leaving the pool free for others."""
+    local_sites.delay = 1
+    monkeypatch.setattr(parked_api, 'FETCH_DEADLINE', 0.2)
+
+    domains = [Domain('slow{}.example.com'.format(i)) for i in range(15)]
+    checks = [threading.Thread(target=parked_api.get_score, args=(domain,))
+              for domain
+              in domains]
+    for check in checks:
+        check.start()
+    for check in checks:
+        check.join()
+
+    local_sites.delay = 0
+    score = parked_api.get_score(Domain('www.example.com'))
+
+    assert score[-1] is False
+    assert score[:2] == (0.0, 'Unlikely')
+
+
+def test_timed_out_checks_are_reported(local_sites, monkeypatch, webapp):
+    local_sites.delay = 1
+    monkeypatch.setattr(parked_api, 'FETCH_DEADLINE', 0.2)
+
+    hexdomain = Domain('www.example.com').to_hex()
+    response = webapp.get('/api/parked/{}'.format(hexdomain)).json
+
+    assert response['timed_out'] is True
+    assert response['score'] == 0.0
+    assert response['score_text'] == 'Unlikely'
+
+
+def test_page_reads_are_bounded(local_sites):
+    """Only the start of a page is read, however long it is."""
+    local_sites.endless = True
+
+    score = parked_api.get_score(Domain('www.example.com'))
+
+    assert score[1] == 'Possibly'
+    assert score[5] == 2 * parked_api.CONTENT_MAX
+
+
+def test_failed_fetches_are_cached_briefly(monkeypatch):
+    """A site that is briefly down isn't scored as down for long."""
+    now = [0]
+    monkeypatch.setattr(
+        parked_api, 'SCORE_CACHE', LRUCache(10, clock=lambda: now[0])
+    )
+    site_up = [False]
+
+    def fake_redirects(domain, path='', deadline=None):
+        if not site_up[0]:
+            raise requests.exceptions.ConnectionError()
+        return False, domain, 'buy this domain, for sale', 100
+    monkeypatch.setattr(parked_api, '_domain_redirects', fake_redirects)
+
+    domain = Domain('www.example.com')
+    assert parked_api.get_score(domain)[1] == 'Unlikely'
+
+    site_up[0] = True
+    now[0] = parked_api.SCORE_ERROR_TTL - 1
+    assert parked_api.get_score(domain)[1] == 'Unlikely'
+
+    now[0] = parked_api.SCORE_ERROR_TTL
+    score = parked_api.get_score(domain)
+    assert score[1] == 'Possibly'
+
+    now[0] = parked_api.SCORE_TTL - 1
+    assert parked_api.get_score(domain) == score
+
+
+def test_unknown_charsets_are_decoded_as_utf8(f_httpretty):
+    for path in ('', 'dnstwister_parked_check'):
+        f_httpretty.register_uri(
+            f_httpretty.GET, 'http://www.example.com:80/' + path,
+            body='domain for sale \u2013 buy this domain'.encode('utf-8'),
+            content_type='text/html; charset=bogus-charset',
+        )
+
+    domain = Domain('www.example.com')
+    _, _, text, _ = parked_api._domain_redirects(domain)
+
+    assert text == 'domain for sale \u2013 buy this domain'
+    assert parked_api.get_score(domain)[1] == 'Possibly'
+
+
+def test_a_timed_out_fetch_keeps_the_other_fetch_score(monkeypatch):
+    def fake_redirects(domain, path='', deadline=None):
+        if path:
+            raise requests.exceptions.ConnectTimeout()
+        return False, domain, 'buy this domain, for sale', 100
+    monkeypatch.setattr(parked_api, '_domain_redirects', fake_redirects)
+
+    score = parked_api.get_score(Domain('www.example.com'))
+
+    assert score[:2] == (0.29, 'Possibly')
+    assert score[-1] is True
+
+
+def test_undeclared_charsets_are_decoded_as_utf8():
+    assert parked_api._decode('for sale \u2013'.encode('utf-8'), None) == (
+        'for sale \u2013'
+    )
@@ -24,6 +24,7 @@ def test_resolve(webapp):
         u'fuzz_url': u'http://localhost/api/fuzz/{}'.format(hexdomain),
         u'parked_score_url': u'http://localhost/api/parked/{}'.format(hexdomain),
         u'url': u'http://localhost/api/ip/{}'.format(hexdomain),
+        u'wildcard': False,
     }
 
     # Will throw socket.error exception if this is not a valid IP address.
@@ -49,7 +50,8 @@ def test_unicode_resolve(webapp):
         u'error': False,
         u'fuzz_url': u'http://localhost/api/fuzz/786e2d2d7374657272656963682d7a37612e69636f6d2e6d757365756d',
         u'parked_score_url': u'http://localhost/api/parked/786e2d2d7374657272656963682d7a37612e69636f6d2e6d757365756d',
-        u'url': u'http://localhost/api/ip/786e2d2d7374657272656963682d7a37612e69636f6d2e6d757365756d'
+        u'url': u'http://localhost/api/ip/786e2d2d7374657272656963682d7a37612e69636f6d2e6d757365756d',
+        u'wildcard': False,
     }
 
     # Will throw socket.error exception if this is not a valid IP address.
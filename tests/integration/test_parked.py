@@ -10,7 +10,9 @@ def test_parked_query(webapp):
 
     assert request.status_code == 200
 
-    assert request.json == {
+    payload = request.json
+    assert payload.pop('bytes_read') > 0
+    assert payload == {
         u'domain': u'dnstwister.report',
         u'domain_as_hexadecimal': hexdomain,
         u'dressed': False,
@@ -20,6 +22,7 @@ def test_parked_query(webapp):
         u'resolve_ip_url': u'http://localhost/api/ip/{}'.format(hexdomain),
         u'score': 0.07,
         u'score_text': u'Possibly',
+        u'timed_out': False,
         u'url': u'http://localhost/api/parked/{}'.format(hexdomain),
     }
 
@@ -36,3 +39,4 @@ def test_parked_query_on_broken_domain(webapp):
     assert request.json['redirects_to'] is None
     assert request.json['score_text'] == 'Unlikely'
     assert request.json['dressed'] is False
+    assert request.json['bytes_read'] == 0
@@ -1,6 +1,10 @@
 """Mocks."""
 import datetime
 
+from dnstwister.core.domain import Domain
+from dnstwister.dnstwist import FuzzResult
+from dnstwister.tools.async_dns import Resolution
+
 
 DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 
@@ -84,6 +88,10 @@ class SimpleFuzzer(object):
             {'domain-name': self._domain[:-1], 'fuzzer': 'Pretend'},
         ]
 
+    def iter_fuzz(self):
+        for result in self.domains:
+            yield FuzzResult(result['fuzzer'], Domain(result['domain-name']))
+
 
 class NoFuzzer(object):
     """Replace the fuzzer with something that returns nothing but the
@@ -99,3 +107,16 @@ class NoFuzzer(object):
         return [
             {'domain-name': self._domain, 'fuzzer': 'Original*'},
         ]
+
+    def iter_fuzz(self):
+        for result in self.domains:
+            yield FuzzResult(result['fuzzer'], Domain(result['domain-name']))
+
+
+def resolve_all(items, key=None, ordered=True, details=False):
+    """Resolve everything to the same, impossible, IP address."""
+    for item in items:
+        resolution = Resolution(
+            '', 'NOERROR', ('999.999.999.999',), None, 0.0
+        )
+        yield item, resolution if details else resolution.result
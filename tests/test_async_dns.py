@@ -0,0 +1,571 @@
+"""Test the asyncio DNS resolution engine against a local stub DNS server."""
+import asyncio
+import socket
+import threading
+import time
+
+import dns.exception
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+import pytest
+
+from dnstwister.core.cache import LRUCache
+from dnstwister.core.cache import SQLiteCache
+from dnstwister.core.domain import Domain
+from dnstwister.tools import async_dns
+
+
+def stub_answer(query):
+    """Build the stub server's response to a query, or None to not reply."""
+    name = query.question[0].name.to_text()
+    rdtype = dns.rdatatype.to_text(query.question[0].rdtype)
+    response = dns.message.make_response(query)
+
+    def answer(*args):
+        response.answer.append(dns.rrset.from_text(*args))
+
+    if name == 'real.wild.':
+        if rdtype == 'A':
+            answer(name, 300, 'IN', 'A', '6.6.6.6')
+    elif name.endswith('.wild.'):
+        if rdtype == 'A':
+            answer(name, 300, 'IN', 'A', '5.5.5.5')
+    elif name.endswith('.slow.com.'):
+        return
+    elif name.startswith('dnstwister-'):
+        response.set_rcode(dns.rcode.NXDOMAIN)
+    elif name.endswith('.squatted.com.'):
+        if rdtype == 'A':
+            answer(name, 300, 'IN', 'A', '7.7.7.7')
+    elif name == 'slow.com.':
+        return
+    elif name == 'nx.com.':
+        response.set_rcode(dns.rcode.NXDOMAIN)
+    elif name == 'nxslow.com.':
+        if rdtype != 'A':
+            return
+        response.set_rcode(dns.rcode.NXDOMAIN)
+    elif name == 'fail.com.':
+        response.set_rcode(dns.rcode.SERVFAIL)
+    elif name == 'local.com.':
+        if rdtype == 'A':
+            answer(name, 300, 'IN', 'A', '127.0.0.1')
+    elif name == 'cname.com.':
+        answer(name, 300, 'IN', 'CNAME', 'a.com.')
+        if rdtype == 'A':
+            answer('a.com.', 300, 'IN', 'A', '1.2.3.4')
+    elif name == 'empty.com.':
+        pass
+    elif name == 'v6.com.':
+        if rdtype == 'AAAA':
+            answer(name, 300, 'IN', 'AAAA', '2001:db8::1')
+    elif name == 'slowv6.com.':
+        if rdtype != 'A':
+            return
+        answer(name, 300, 'IN', 'A', '1.2.3.4')
+    elif rdtype == 'A':
+        answer(name, 300, 'IN', 'A', '10.0.0.2', '9.0.0.1')
+    elif rdtype == 'AAAA':
+        answer(name, 300, 'IN', 'AAAA', '2001:db8::2', '2001:db8::1')
+    elif rdtype == 'MX':
+        answer(name, 300, 'IN', 'MX', '20 mx2.example.com.', '10 mx1.example.com.')
+
+    return response
+
+
+QUERIES = []
+PROBES = []
+
+
+@pytest.yield_fixture
+def stub_dns():
+    """A local UDP DNS server, answering from stub_answer().
+
+    The names and types queried are recorded in QUERIES, but for wildcard
+    probes, which are recorded in PROBES.
+    """
+    del QUERIES[:]
+    del PROBES[:]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(0.1)
+    running = True
+
+    def serve():
+        while running:
+            try:
+                data, addr = sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            query = dns.message.from_wire(data)
+            name = query.question[0].name.to_text()
+            (PROBES if name.startswith('dnstwister-') else QUERIES).append(
+                '{} {}'.format(
+                    name, dns.rdatatype.to_text(query.question[0].rdtype)
+                )
+            )
+            response = stub_answer(query)
+            if response is not None:
+                sock.sendto(response.to_wire(), addr)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+
+    yield sock.getsockname()
+
+    running = False
+    thread.join()
+    sock.close()
+
+
+@pytest.yield_fixture
+def engines():
+    """Make Engines, closing them after the test."""
+    made = []
+
+    def make(*args, **kwargs):
+        engine = async_dns.Engine(*args, **kwargs)
+        made.append(engine)
+        return engine
+
+    yield make
+
+    for engine in made:
+        engine.close()
+
+
+def test_resolve_all(stub_dns, engines):
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=0.5)
+
+    domains = [Domain(d) for d in (
+        'a.com', 'nx.com', 'fail.com', 'local.com', 'cname.com', 'empty.com', 'slow.com'
+    )]
+
+    assert list(engine.resolve_all(domains)) == [
+        (Domain('a.com'), ('9.0.0.1', False)),
+        (Domain('nx.com'), (False, False)),
+        (Domain('fail.com'), (False, True)),
+        (Domain('local.com'), (False, True)),
+        (Domain('cname.com'), ('1.2.3.4', False)),
+        (Domain('empty.com'), (False, False)),
+        (Domain('slow.com'), (False, True)),
+    ]
+
+
+def test_resolve_all_uses_key(stub_dns, engines):
+    host, port = stub_dns
+    engine = engines([host], port=port)
+
+    items = [('first', Domain('a.com')), ('second', Domain('nx.com'))]
+    results = engine.resolve_all(items, key=lambda item: item[1])
+
+    assert [(item[0], result) for (item, result) in results] == [
+        ('first', ('9.0.0.1', False)),
+        ('second', (False, False)),
+    ]
+
+
+def test_resolves_many_domains_concurrently(stub_dns, engines):
+    """Slow lookups don't hold up the others, within the pool size."""
+    host, port = stub_dns
+    engine = engines([host], port=port, size=50, timeout=0.5)
+
+    domains = [Domain('slow.com')] * 10 + [
+        Domain('d{}.com'.format(i)) for i in range(1000)
+    ]
+
+    results = [result for (_, result) in engine.resolve_all(domains)]
+
+    assert results[:10] == [(False, True)] * 10
+    assert results[10:] == [('9.0.0.1', False)] * 1000
+
+
+def test_unreachable_nameserver_is_an_error(engines):
+    engine = engines(['127.0.0.1'], port=1, timeout=0.5)
+
+    assert list(engine.resolve_all([Domain('a.com')])) == [
+        (Domain('a.com'), (False, True)),
+    ]
+
+
+def test_resolve_all_takes_items_lazily(stub_dns, engines):
+    """Only queue_size items are taken ahead of the results consumed."""
+    host, port = stub_dns
+    engine = engines([host], port=port, queue_size=10)
+    taken = []
+
+    def domains():
+        for i in range(100):
+            taken.append(i)
+            yield Domain('d{}.com'.format(i))
+
+    results = engine.resolve_all(domains())
+
+    assert next(results) == (Domain('d0.com'), ('9.0.0.1', False))
+    assert len(taken) == 10
+
+    assert len(list(results)) == 99
+    assert len(taken) == 100
+
+
+def test_jobs_are_taken_round_robin_across_requests():
+    engine = async_dns.Engine([])
+    engine._work = threading.Event()
+
+    first, second = async_dns._Batch(), async_dns._Batch()
+    for name in ('a1', 'a2', 'a3'):
+        engine._enqueue(first, name, None)
+    for name in ('b1', 'b2'):
+        engine._enqueue(second, name, None)
+
+    assert engine.stats['queued'] == 5
+    assert engine.stats['requests'] == 2
+
+    order = []
+    while True:
+        job = engine._next_job()
+        if job is None:
+            break
+        order.append(job[0])
+
+    assert order == ['a1', 'b1', 'a2', 'b2', 'a3']
+    assert engine.stats['queued'] == 0
+    assert engine.stats['requests'] == 0
+
+
+def test_stats(stub_dns, engines):
+    host, port = stub_dns
+    engine = engines([host], port=port, size=5, timeout=0.2)
+
+    list(engine.resolve_all([Domain('a.com'), Domain('slow.com')]))
+
+    stats = engine.stats
+    assert stats['size'] == 5
+    assert stats['resolved'] == 2
+    assert stats['timeouts'] == 1
+    assert stats['queued'] == 0
+    assert stats['in_flight'] == 0
+
+
+def test_results_are_cached(stub_dns, engines):
+    host, port = stub_dns
+    cache = LRUCache(10)
+    engine = engines([host], port=port, cache=cache)
+
+    domains = [Domain('a.com'), Domain('nx.com')]
+    assert list(engine.resolve_all(domains)) == list(engine.resolve_all(domains))
+
+    assert sorted(QUERIES) == ['a.com. A', 'a.com. AAAA', 'nx.com. A', 'nx.com. AAAA']
+    assert cache.stats['hits'] == 2
+    assert cache.get('a.com').result == ('9.0.0.1', False)
+
+
+def test_response_ttl():
+    response = stub_answer(dns.message.make_query('cname.com', 'A'))
+    response.answer[1].ttl = 60
+
+    assert async_dns.response_ttl(response) == 60
+    assert async_dns.response_ttl(
+        stub_answer(dns.message.make_query('nx.com', 'A'))
+    ) is None
+
+
+def test_concurrent_resolutions_share_a_lookup(stub_dns, engines):
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=0.2)
+
+    domains = [Domain('a.com')] * 5 + [Domain('slow.com')] * 5
+    results = [result for (_, result) in engine.resolve_all(domains)]
+
+    assert results == [('9.0.0.1', False)] * 5 + [(False, True)] * 5
+    assert sorted(set(QUERIES)) == [
+        'a.com. A', 'a.com. AAAA', 'slow.com. A', 'slow.com. AAAA'
+    ]
+    assert engine.stats['coalesced'] >= 4
+
+
+def test_resolve_all_unordered(stub_dns, engines):
+    """Unordered results are yielded as soon as they are resolved."""
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=0.5)
+
+    domains = [Domain('slow.com'), Domain('a.com'), Domain('nx.com')]
+    results = list(engine.resolve_all(domains, ordered=False))
+
+    assert results[-1] == (Domain('slow.com'), (False, True))
+    assert dict(results[:2]) == {
+        Domain('a.com'): ('9.0.0.1', False),
+        Domain('nx.com'): (False, False),
+    }
+
+
+def test_resolve_details(stub_dns, engines):
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=0.5)
+
+    resolution = engine.resolve_one(Domain('a.com'), mx=True)
+
+    assert resolution.domain == 'a.com'
+    assert resolution.rcode == 'NOERROR'
+    assert resolution.addresses == (
+        '9.0.0.1', '10.0.0.2', '2001:db8::1', '2001:db8::2'
+    )
+    assert resolution.mx == ((10, 'mx1.example.com'), (20, 'mx2.example.com'))
+    assert 0 < resolution.elapsed < 0.5
+    assert resolution.result == ('9.0.0.1', False)
+
+    assert engine.resolve_one(Domain('a.com')).mx is None
+
+
+def test_resolve_details_failures(stub_dns, engines):
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=0.5)
+
+    def details(domain):
+        resolution = engine.resolve_one(Domain(domain))
+        return resolution.rcode, resolution.addresses, resolution.result
+
+    assert details('nx.com') == ('NXDOMAIN', (), (False, False))
+    assert details('fail.com') == ('SERVFAIL', (), (False, True))
+    assert details('empty.com') == ('NOERROR', (), (False, False))
+    assert details('slow.com') == ('TIMEOUT', (), (False, True))
+
+
+def test_resolves_ipv6_only_domains(stub_dns, engines):
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=0.5)
+
+    assert engine.resolve_one(Domain('v6.com')).result == ('2001:db8::1', False)
+
+
+def test_partial_answers_within_the_deadline_are_used(stub_dns, engines):
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=0.2)
+
+    resolution = engine.resolve_one(Domain('slowv6.com'))
+
+    assert resolution.addresses == ('1.2.3.4',)
+    assert resolution.result == ('1.2.3.4', False)
+    assert engine.stats['timeouts'] == 1
+
+
+def test_nxdomain_ends_the_lookup(stub_dns, engines):
+    """An NXDOMAIN answer doesn't wait for the other queries."""
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=2)
+
+    resolution = engine.resolve_one(Domain('nxslow.com'))
+
+    assert resolution.rcode == 'NXDOMAIN'
+    assert resolution.elapsed < 1
+
+
+def test_domains_only_matching_a_wildcard_are_marked(stub_dns, engines):
+    """Domains resolving to a wildcard in their public suffix still resolve,
+    but are marked.
+    """
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=0.5)
+
+    resolution = engine.resolve_one(Domain('typo.wild'))
+
+    assert resolution.addresses == ('5.5.5.5',)
+    assert resolution.wildcard
+    assert resolution.result == ('5.5.5.5', False)
+    assert engine.stats['wildcards'] == 1
+    assert PROBES[0].endswith('.wild. A')
+
+
+def test_real_domains_under_wildcard_suffixes_are_not_marked(stub_dns, engines):
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=0.5)
+
+    resolution = engine.resolve_one(Domain('real.wild'))
+
+    assert not resolution.wildcard
+    assert resolution.result == ('6.6.6.6', False)
+    assert not engine.resolve_one(Domain('a.com')).wildcard
+
+
+def test_wildcards_within_registered_domains_are_not_marked(stub_dns, engines):
+    """A squatter's wildcard on their own domain doesn't hide their
+    subdomains - only public suffixes are probed.
+    """
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=0.5)
+
+    resolution = engine.resolve_one(Domain('www.squatted.com'))
+
+    assert not resolution.wildcard
+    assert resolution.result == ('7.7.7.7', False)
+    assert all(probe.split('.', 1)[1] in ('com. A', 'com. AAAA')
+               for probe
+               in PROBES)
+
+
+def test_each_suffix_is_probed_once(stub_dns, engines):
+    host, port = stub_dns
+    engine = engines([host], port=port, cache=LRUCache(100))
+
+    domains = [Domain(d) for d in (
+        'a.com', 'b.com', 'www.c.com', 'x.wild', 'y.wild',
+    )]
+    list(engine.resolve_all(domains))
+
+    assert sorted(probe.split('.', 1)[1] for probe in PROBES) == [
+        'com. A', 'com. AAAA', 'wild. A', 'wild. AAAA',
+    ]
+
+
+def test_probes_share_the_lookup_deadline(stub_dns, engines, monkeypatch):
+    """A probe that doesn't answer doesn't hold up a slow lookup past its
+    timeout.
+    """
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=0.3)
+    monkeypatch.setattr(async_dns, 'suffix_zone', lambda domain: 'slow.com')
+
+    started = time.monotonic()
+    resolution = engine.resolve_one(Domain('slowv6.com'))
+
+    assert time.monotonic() - started < 0.5
+    assert resolution.result == ('1.2.3.4', False)
+    assert not resolution.wildcard
+
+
+def test_skip_wildcards(stub_dns, engines):
+    """Once a suffix is known to be wildcarded its domains aren't queried."""
+    host, port = stub_dns
+    engine = engines(
+        [host], port=port, cache=LRUCache(100), skip_wildcards=True
+    )
+
+    assert engine.resolve_one(Domain('x.wild')).wildcard
+    del QUERIES[:]
+
+    resolution = engine.resolve_one(Domain('y.wild'))
+
+    assert resolution.wildcard
+    assert resolution.addresses == ('5.5.5.5',)
+    assert QUERIES == []
+    assert engine.stats['wildcards'] == 2
+
+
+def test_resolve_all_details(stub_dns, engines):
+    host, port = stub_dns
+    engine = engines([host], port=port)
+
+    results = engine.resolve_all([Domain('typo.wild')], details=True)
+    (domain, resolution), = list(results)
+
+    assert domain == Domain('typo.wild')
+    assert resolution.wildcard
+
+
+def test_shared_cache_is_read_and_written(stub_dns, engines, tmp_path):
+    host, port = stub_dns
+    shared = SQLiteCache(str(tmp_path / 'cache.db'), 'resolutions', 100)
+
+    first = engines([host], port=port, cache=LRUCache(10), shared_cache=shared)
+    assert first.resolve_one(Domain('a.com')).result == ('9.0.0.1', False)
+
+    # Writes to the shared cache don't block the lookup, so wait for it.
+    for _ in range(100):
+        if shared.get('a.com') is not None:
+            break
+        threading.Event().wait(0.01)
+    del QUERIES[:]
+
+    second = engines([host], port=port, cache=LRUCache(10), shared_cache=shared)
+    assert second.resolve_one(Domain('a.com')).result == ('9.0.0.1', False)
+    assert QUERIES == []
+
+
+def test_shared_cache_does_not_block_the_event_loop(stub_dns, engines):
+    """A slow shared cache read only holds up its own domain."""
+    host, port = stub_dns
+    release = threading.Event()
+
+    class StuckCache:
+        def get(self, key, default=None):
+            if key == 'stuck.com':
+                release.wait(5)
+            return default
+
+        def set(self, key, value, ttl=None):
+            pass
+
+    engine = engines([host], port=port, shared_cache=StuckCache())
+
+    results = engine.resolve_all(
+        [Domain('stuck.com'), Domain('a.com')], ordered=False
+    )
+    assert next(results) == (Domain('a.com'), ('9.0.0.1', False))
+
+    release.set()
+    assert next(results) == (Domain('stuck.com'), ('9.0.0.1', False))
+
+
+def test_probes_of_long_names_are_skipped(stub_dns, engines, monkeypatch):
+    """A valid domain's probe name can be too long to query."""
+    host, port = stub_dns
+    engine = engines([host], port=port, timeout=0.5)
+    domain = Domain('.'.join(['a' * 60] * 4) + '.com')
+    monkeypatch.setattr(async_dns, 'suffix_zone', lambda d: d.to_ascii())
+
+    resolution = engine.resolve_one(domain)
+
+    assert resolution.result == ('9.0.0.1', False)
+    assert not resolution.wildcard
+    assert PROBES == []
+
+
+def test_dns_errors_are_failed_queries(engines, monkeypatch):
+    async def bad_query(*args):
+        raise dns.exception.FormError()
+    monkeypatch.setattr(async_dns, 'query', bad_query)
+    engine = engines(['127.0.0.1'], timeout=0.5)
+
+    assert engine.resolve_one(Domain('a.com')).result == (False, True)
+    assert list(engine.resolve_all([Domain('b.com')])) == [
+        (Domain('b.com'), (False, True)),
+    ]
+
+
+def test_coalesced_resolutions_share_a_failed_lookup(stub_dns, engines):
+    """A failing lookup fails every resolution sharing it, without losing
+    any workers.
+    """
+    host, port = stub_dns
+    engine = engines([host], port=port, size=3)
+    real_lookup = engine._lookup
+
+    async def failing_lookup(idna_domain, mx):
+        await real_lookup(idna_domain, mx)
+        raise RuntimeError('lookup failed')
+    engine._lookup = failing_lookup
+
+    async def resolve_twice():
+        return await asyncio.gather(
+            engine.resolve_details(Domain('a.com')),
+            engine.resolve_details(Domain('a.com')),
+            return_exceptions=True,
+        )
+    loop = engine._start()
+    results = asyncio.run_coroutine_threadsafe(resolve_twice(), loop).result()
+
+    assert [type(result) for result in results] == [RuntimeError] * 2
+    assert engine.stats['coalesced'] == 1
+
+    with pytest.raises(RuntimeError):
+        list(engine.resolve_all([Domain('b.com')] * 3))
+
+    engine._lookup = real_lookup
+    assert all(not worker.done() for worker in engine._workers)
+    assert list(engine.resolve_all([Domain('c.com')] * 3)) == [
+        (Domain('c.com'), ('9.0.0.1', False)),
+    ] * 3
+    assert engine.stats['in_flight'] == 0
@@ -0,0 +1,160 @@
+import pytest
+
+import dnstwister.core.cache
+from dnstwister.core.cache import LRUCache
+from dnstwister.core.cache import SQLiteCache
+from dnstwister.core.domain import Domain
+
+
+def test_can_get_and_set():
+    cache = LRUCache(10)
+    assert cache.get('a') is None
+    assert cache.get('a', 'default') == 'default'
+
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_evicts_by_size():
+    cache = LRUCache(5, sizeof=len)
+    cache.set('a', (1, 2, 3))
+    cache.set('b', (1, 2))
+    assert len(cache) == 2
+
+    cache.set('c', (1,))
+    assert cache.get('a') is None
+    assert cache.stats['size'] == 3
+
+    cache.set('d', (1, 2, 3, 4, 5, 6))
+    assert cache.get('d') is None
+
+
+def test_counts_hits_and_misses():
+    cache = LRUCache(10)
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('a')
+    cache.get('b')
+
+    assert cache.stats == {
+        'entries': 1,
+        'size': 1,
+        'max_size': 10,
+        'hits': 2,
+        'misses': 1,
+    }
+
+    cache.clear()
+    assert cache.stats['hits'] == 0
+    assert len(cache) == 0
+
+
+def test_expires_entries_after_their_ttl():
+    now = [100.0]
+    cache = LRUCache(10, clock=lambda: now[0])
+    cache.set('a', 1, ttl=60)
+    cache.set('b', 2)
+
+    now[0] += 59
+    assert cache.get('a') == 1
+
+    now[0] += 1
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert cache.stats['entries'] == 1
+    assert cache.stats['misses'] == 1
+
+
+def test_sqlite_cache_can_get_and_set(tmpdir):
+    cache = SQLiteCache(str(tmpdir.join('cache.db')), 'test', 10)
+    assert cache.get('a') is None
+    assert cache.get('a', 'default') == 'default'
+
+    cache.set('a', ('1.2.3.4', False))
+    cache.set('b', Domain('www.example.com'))
+
+    assert cache.get('a') == ('1.2.3.4', False)
+    assert cache.get('b') == Domain('www.example.com')
+    assert cache.stats == {
+        'entries': 2,
+        'size': 2,
+        'max_size': 10,
+        'hits': 2,
+        'misses': 2,
+    }
+
+
+def test_sqlite_cache_is_shared_via_the_database(tmpdir):
+    """Processes using the same database file share entries."""
+    path = str(tmpdir.join('cache.db'))
+    SQLiteCache(path, 'test', 10).set('a', 1)
+
+    assert SQLiteCache(path, 'test', 10).get('a') == 1
+    assert SQLiteCache(path, 'other', 10).get('a') is None
+
+
+def test_sqlite_cache_expires_entries_after_their_ttl(tmpdir):
+    now = [100.0]
+    cache = SQLiteCache(
+        str(tmpdir.join('cache.db')), 'test', 10, clock=lambda: now[0]
+    )
+    cache.set('a', 1, ttl=60)
+    cache.set('b', 2)
+
+    now[0] += 59
+    assert cache.get('a') == 1
+
+    now[0] += 1
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+
+
+def test_sqlite_cache_evicts_oldest_writes(tmpdir, monkeypatch):
+    monkeypatch.setattr('dnstwister.core.cache.PRUNE_INTERVAL', 5)
+    cache = SQLiteCache(str(tmpdir.join('cache.db')), 'test', 3)
+
+    for key in 'abcd':
+        cache.set(key, key)
+    cache.set('a', 'a')
+
+    assert len(cache) == 3
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == ['a', 'c', 'd']
+
+
+def test_sqlite_cache_errors_are_misses(tmpdir):
+    cache = SQLiteCache(str(tmpdir), 'test', 10)
+
+    cache.set('a', 1)
+    assert cache.get('a') is None
+    assert cache.stats['misses'] == 1
+
+
+def test_sqlite_cache_names_are_validated(tmpdir):
+    with pytest.raises(ValueError):
+        SQLiteCache(str(tmpdir.join('cache.db')), 'test; DROP TABLE', 10)
+
+
+def test_shared_cache_backend(tmpdir, monkeypatch):
+    monkeypatch.setattr('dnstwister.core.cache.CACHE_DB', None)
+    assert isinstance(dnstwister.core.cache.shared_cache('test', 10), LRUCache)
+
+    monkeypatch.setattr(
+        'dnstwister.core.cache.CACHE_DB', str(tmpdir.join('cache.db'))
+    )
+    assert isinstance(
+        dnstwister.core.cache.shared_cache('test', 10), SQLiteCache
+    )
+
@@ -104,3 +104,57 @@ def test_uses_idna_2008_encoding():
     assert 'straße.de'.encode('idna').decode() == 'strasse.de'
     assert Domain('straße.de').to_ascii() == 'xn--strae-oqa.de'
 
+
+
+def test_repeated_parsing_is_cached(monkeypatch):
+    """IDNA conversion is slow, so each distinct domain is only parsed once."""
+    Domain('cached.example.com')
+
+    def no_idna(*args):
+        raise Exception('Should not encode again')
+    monkeypatch.setattr('dnstwister.core.domain.idna.encode', no_idna)
+    monkeypatch.setattr('dnstwister.core.domain.idna.decode', no_idna)
+
+    assert Domain('cached.example.com').to_ascii() == 'cached.example.com'
+    assert Domain.try_parse('cached.example.com') == Domain('cached.example.com')
+
+
+def test_unhashable_values_are_invalid():
+    with pytest.raises(InvalidDomainException):
+        Domain(['a.com'])
+
+    assert Domain.try_parse({}) is None
+
+
+def test_hashing_is_consistent_with_equality():
+    assert hash(Domain('ӓ.com')) == hash(Domain('xn--w5a.com'))
+    assert hash(Domain('ӓ.com')) == hash('xn--w5a.com')
+    assert len({Domain('ӓ.com'), Domain('xn--w5a.com'), Domain(b'xn--w5a.com')}) == 1
+
+
+def test_can_use_domains_as_keys():
+    lookup = {Domain('ӓ.com'): 1}
+    assert lookup[Domain('xn--w5a.com')] == 1
+    assert Domain('a.com') not in lookup
+
+
+def test_can_parse_with_known_valid_suffix():
+    domain = Domain.try_parse_with_suffix('ӓ', 'com', 'com')
+    assert domain == Domain('ӓ.com')
+    assert domain.to_unicode() == 'ӓ.com'
+    assert domain.to_ascii() == 'xn--w5a.com'
+
+    domain = Domain.try_parse_with_suffix('www.straße', 'de', 'de')
+    assert domain.to_ascii() == 'www.xn--strae-oqa.de'
+
+
+def test_parse_with_suffix_validates_the_name():
+    assert Domain.try_parse_with_suffix('-a', 'com', 'com') is None
+    assert Domain.try_parse_with_suffix('a..b', 'com', 'com') is None
+    assert Domain.try_parse_with_suffix('a' * 64, 'com', 'com') is None
+    assert Domain.try_parse_with_suffix(u'a\uDFFFa', 'com', 'com') is None
+
+
+def test_parse_with_suffix_normalises_like_try_parse():
+    assert Domain.try_parse_with_suffix('xn--w5a', 'com', 'com').to_unicode() == 'ӓ.com'
+    assert Domain.try_parse_with_suffix('ABC', 'com', 'com').to_unicode() == 'abc.com'
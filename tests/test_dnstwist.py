@@ -34,7 +34,7 @@ def test_all_twisted_domains_are_valid_idna2008():
         fuzzer = dnstwister.dnstwist.DomainFuzzer(domain)
         fuzzer.fuzz()
         for result in fuzzer.domains:
-            candidate = result['domain-name']
+            candidate = result.unicode
             try:
                 Domain(candidate)
             except dnstwister.core.domain.InvalidDomainException:
@@ -45,7 +45,7 @@ def test_longer_domain_is_completely_valid():
     domain = Domain('xn--sterreich-z7a.icom.museum')
     fuzzer = dnstwister.dnstwist.DomainFuzzer(domain.to_unicode())
     fuzzer.fuzz()
-    [Domain(d['domain-name']) for d in fuzzer.domains]
+    [Domain(d.unicode) for d in fuzzer.domains]
 
 
 def test_small_domain_stats():
@@ -116,12 +116,16 @@ def test_medium_domain_with_subdomain_stats():
 
 def breakdown(result):
     return dict(
-        [(f, len([d for d in result if d['fuzzer'] == f]))
+        [(f, len([d for d in result if d.fuzzer == f]))
          for f
-         in set([d['fuzzer'] for d in result])]
+         in set([d.fuzzer for d in result])]
      )
 
 
+def as_dict(result):
+    return {'domain-name': result.unicode, 'fuzzer': result.fuzzer}
+
+
 def test_unicode_fuzzing():
     """Test can fuzz and generate unicode."""
     unicode_domain = Domain('xn--domain.com').to_unicode()
@@ -129,7 +133,7 @@ def test_unicode_fuzzing():
     fuzzer = dnstwister.dnstwist.DomainFuzzer(unicode_domain)
     fuzzer.fuzz()
 
-    assert sorted([d['domain-name'] for d in fuzzer.domains]) == [
+    assert sorted([d.unicode for d in fuzzer.domains]) == [
         u'www-\u3bd9\u3bdc\u3bd9\u3bdf.com',
         u'www\u3bd9\u3bdc\u3bd9\u3bdf.com',
         u'ww\u3bd9\u3bdc\u3bd9\u3bdf.com',
@@ -186,6 +190,45 @@ def test_top_level_domains_db_is_loaded():
     assert dnstwister.dnstwist.DB_TLD
 
 
+def test_domain_suffix_splitting():
+    """Domains are split on the shared suffix index before fuzzing."""
+    assert dnstwister.dnstwist.DomainFuzzer('example.com').tld == 'com'
+    assert dnstwister.dnstwist.DomainFuzzer('example.co.uk').tld == 'co.uk'
+
+    fuzzer = dnstwister.dnstwist.DomainFuzzer('www.example.com.au')
+    assert (fuzzer.domain, fuzzer.tld) == ('www.example', 'com.au')
+
+    fuzzer = dnstwister.dnstwist.DomainFuzzer('www.example.com')
+    assert (fuzzer.domain, fuzzer.tld) == ('www.example', 'com')
+
+
+def test_domain_suffix_splitting_wildcards_and_exceptions():
+    """The full public suffix list is used, including '*.ck' and '!www.ck'."""
+    fuzzer = dnstwister.dnstwist.DomainFuzzer('www.example.co.ck')
+    assert (fuzzer.domain, fuzzer.tld) == ('www.example', 'co.ck')
+
+    fuzzer = dnstwister.dnstwist.DomainFuzzer('www.ck')
+    assert (fuzzer.domain, fuzzer.tld) == ('www', 'ck')
+
+    fuzzer = dnstwister.dnstwist.DomainFuzzer('example.city.yokohama.jp')
+    assert (fuzzer.domain, fuzzer.tld) == ('example.city', 'yokohama.jp')
+
+    fuzzer = dnstwister.dnstwist.DomainFuzzer('example.test.yokohama.jp')
+    assert (fuzzer.domain, fuzzer.tld) == ('example', 'test.yokohama.jp')
+
+
+def test_domain_suffix_splitting_wildcards_with_explicit_rules():
+    """'*.il' still matches 'co.il' though 'blogspot.co.il' is listed."""
+    fuzzer = dnstwister.dnstwist.DomainFuzzer('example.co.il')
+    assert (fuzzer.domain, fuzzer.tld) == ('example', 'co.il')
+
+    fuzzer = dnstwister.dnstwist.DomainFuzzer('www.example.co.ke')
+    assert (fuzzer.domain, fuzzer.tld) == ('www.example', 'co.ke')
+
+    fuzzer = dnstwister.dnstwist.DomainFuzzer('example.blogspot.co.il')
+    assert (fuzzer.domain, fuzzer.tld) == ('example', 'blogspot.co.il')
+
+
 def test_basic_fuzz():
     """Test of the fuzzer.
 
@@ -194,7 +237,7 @@ def test_basic_fuzz():
     fuzzer = dnstwister.dnstwist.DomainFuzzer('www.example.com')
     fuzzer.fuzz()
 
-    assert sorted(fuzzer.domains, key=lambda d: d['domain-name']) == [
+    assert sorted(map(as_dict, fuzzer.domains), key=lambda d: d['domain-name']) == [
         {'domain-name': '2ww.example.com', 'fuzzer': 'Replacement'},
         {'domain-name': '3ww.example.com', 'fuzzer': 'Replacement'},
         {'domain-name': '7ww.example.com', 'fuzzer': 'Bitsquatting'},
@@ -584,7 +627,7 @@ def test_strange_unicode_k():
     fuzzer = dnstwister.dnstwist.DomainFuzzer(domain.to_unicode())
     fuzzer.fuzz()
 
-    results = [Domain(d['domain-name']).to_ascii() for d in fuzzer.domains]
+    results = [d.ascii for d in fuzzer.domains]
     assert len(results) == 78
     assert len(set(results)) == 78
     assert sorted(results) == [
@@ -670,3 +713,49 @@ def test_strange_unicode_k():
 
     filtered_results = dnstwister.tools.analyse(domain)
     assert len(filtered_results[1]['fuzzy_domains']) == 78
+
+
+def test_iter_fuzz_streams_the_same_results_as_fuzz():
+    """The generator yields the same deduplicated results, one at a time."""
+    fuzzer = dnstwister.dnstwist.DomainFuzzer('www.example.com')
+    fuzzer.fuzz()
+
+    results = dnstwister.dnstwist.DomainFuzzer('www.example.com').iter_fuzz()
+
+    assert next(results) == ('Original*', Domain('www.example.com'))
+    assert [('Original*', 'www.example.com')] + [
+        (fuzz, domain.to_unicode()) for (fuzz, domain) in results
+    ] == [(d.fuzzer, d.unicode) for d in fuzzer.domains]
+
+
+def test_homoglyph_budget_keeps_most_plausible_variants():
+    """The homoglyph budget caps results, keeping single-character swaps
+    using the first glyphs in the table ahead of everything else.
+    """
+    fuzzer = dnstwister.dnstwist.DomainFuzzer('www.example.com', homoglyph_budget=3)
+    fuzzer.fuzz()
+
+    assert [d.unicode for d in fuzzer.domains if d.fuzzer == 'Homoglyph'] == [
+        'vvww.example.com',
+        'wvvw.example.com',
+        'wwvv.example.com',
+    ]
+
+
+def test_homoglyph_budget_applies_to_long_domains():
+    """Long domains used to be silently truncated at 1000 homoglyphs, in
+    whatever order they were found.
+    """
+    domain = 'zzzzzzzzzzzzzzzzzzzzzzzzzzzzzz.zzzzzzzzzzzzzzzzzzzzzzzzz.com'
+
+    results = [d.unicode
+               for d
+               in dnstwister.dnstwist.DomainFuzzer(domain).iter_fuzz()
+               if d.fuzzer == 'Homoglyph']
+
+    assert len(results) == dnstwister.dnstwist.HOMOGLYPH_BUDGET
+    assert results[0] == 'ʐ' + domain[1:]
+    assert results == [d.unicode
+                       for d
+                       in dnstwister.dnstwist.DomainFuzzer(domain).iter_fuzz()
+                       if d.fuzzer == 'Homoglyph']
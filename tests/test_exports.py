@@ -1,16 +1,29 @@
 """Test the csv/json export functionality."""
 import binascii
+import gzip
 import textwrap
 
 import dnstwister.tools
 import patches
 from dnstwister.core.domain import Domain
+from dnstwister.dnstwist import FuzzResult
+from dnstwister.tools.async_dns import Resolution
+
+
+def wildcard_resolve_all(items, key=None, ordered=True, details=False):
+    """Resolve a.co only to a wildcard, the rest as patches.resolve_all."""
+    for item in items:
+        resolution = Resolution(
+            '', 'NOERROR', ('999.999.999.999',), None, 0.0,
+            wildcard=key(item).to_ascii() == 'a.co',
+        )
+        yield item, resolution if details else resolution.result
 
 
 def test_csv_export(webapp, monkeypatch):
     """Test CSV export"""
     monkeypatch.setattr(
-        'dnstwister.tools.resolve', lambda domain: ('999.999.999.999', False)
+        'dnstwister.tools.resolve_all', patches.resolve_all
     )
 
     domain = Domain('a.com')
@@ -21,60 +34,115 @@ def test_csv_export(webapp, monkeypatch):
     assert response.headers['Content-Disposition'] == 'attachment; filename=dnstwister_report_a.com.csv'
 
     assert '\n'.join(sorted(response.text.strip().split('\n'))) == textwrap.dedent("""
-        Domain,Type,Tweak,IP,Error
-        a.com,Addition,aa.com,999.999.999.999,False
-        a.com,Addition,ab.com,999.999.999.999,False
-        a.com,Addition,ac.com,999.999.999.999,False
-        a.com,Addition,ad.com,999.999.999.999,False
-        a.com,Addition,ae.com,999.999.999.999,False
-        a.com,Addition,af.com,999.999.999.999,False
-        a.com,Addition,ag.com,999.999.999.999,False
-        a.com,Addition,ah.com,999.999.999.999,False
-        a.com,Addition,ai.com,999.999.999.999,False
-        a.com,Addition,aj.com,999.999.999.999,False
-        a.com,Addition,ak.com,999.999.999.999,False
-        a.com,Addition,al.com,999.999.999.999,False
-        a.com,Addition,am.com,999.999.999.999,False
-        a.com,Addition,an.com,999.999.999.999,False
-        a.com,Addition,ao.com,999.999.999.999,False
-        a.com,Addition,ap.com,999.999.999.999,False
-        a.com,Addition,aq.com,999.999.999.999,False
-        a.com,Addition,ar.com,999.999.999.999,False
-        a.com,Addition,as.com,999.999.999.999,False
-        a.com,Addition,at.com,999.999.999.999,False
-        a.com,Addition,au.com,999.999.999.999,False
-        a.com,Addition,av.com,999.999.999.999,False
-        a.com,Addition,aw.com,999.999.999.999,False
-        a.com,Addition,ax.com,999.999.999.999,False
-        a.com,Addition,ay.com,999.999.999.999,False
-        a.com,Addition,az.com,999.999.999.999,False
-        a.com,Bitsquatting,c.com,999.999.999.999,False
-        a.com,Bitsquatting,e.com,999.999.999.999,False
-        a.com,Bitsquatting,i.com,999.999.999.999,False
-        a.com,Bitsquatting,q.com,999.999.999.999,False
-        a.com,Original*,a.com,999.999.999.999,False
-        a.com,Replacement,1.com,999.999.999.999,False
-        a.com,Replacement,2.com,999.999.999.999,False
-        a.com,Replacement,s.com,999.999.999.999,False
-        a.com,Replacement,w.com,999.999.999.999,False
-        a.com,Replacement,y.com,999.999.999.999,False
-        a.com,Replacement,z.com,999.999.999.999,False
-        a.com,Various,acom.com,999.999.999.999,False
-        a.com,Various,wwa.com,999.999.999.999,False
-        a.com,Various,www-a.com,999.999.999.999,False
-        a.com,Various,wwwa.com,999.999.999.999,False
-        a.com,Vowel swap,o.com,999.999.999.999,False
-        a.com,Vowel swap,u.com,999.999.999.999,False
+        Domain,Type,Tweak,IP,Error,Wildcard
+        a.com,Addition,aa.com,999.999.999.999,False,False
+        a.com,Addition,ab.com,999.999.999.999,False,False
+        a.com,Addition,ac.com,999.999.999.999,False,False
+        a.com,Addition,ad.com,999.999.999.999,False,False
+        a.com,Addition,ae.com,999.999.999.999,False,False
+        a.com,Addition,af.com,999.999.999.999,False,False
+        a.com,Addition,ag.com,999.999.999.999,False,False
+        a.com,Addition,ah.com,999.999.999.999,False,False
+        a.com,Addition,ai.com,999.999.999.999,False,False
+        a.com,Addition,aj.com,999.999.999.999,False,False
+        a.com,Addition,ak.com,999.999.999.999,False,False
+        a.com,Addition,al.com,999.999.999.999,False,False
+        a.com,Addition,am.com,999.999.999.999,False,False
+        a.com,Addition,an.com,999.999.999.999,False,False
+        a.com,Addition,ao.com,999.999.999.999,False,False
+        a.com,Addition,ap.com,999.999.999.999,False,False
+        a.com,Addition,aq.com,999.999.999.999,False,False
+        a.com,Addition,ar.com,999.999.999.999,False,False
+        a.com,Addition,as.com,999.999.999.999,False,False
+        a.com,Addition,at.com,999.999.999.999,False,False
+        a.com,Addition,au.com,999.999.999.999,False,False
+        a.com,Addition,av.com,999.999.999.999,False,False
+        a.com,Addition,aw.com,999.999.999.999,False,False
+        a.com,Addition,ax.com,999.999.999.999,False,False
+        a.com,Addition,ay.com,999.999.999.999,False,False
+        a.com,Addition,az.com,999.999.999.999,False,False
+        a.com,Bitsquatting,c.com,999.999.999.999,False,False
+        a.com,Bitsquatting,e.com,999.999.999.999,False,False
+        a.com,Bitsquatting,i.com,999.999.999.999,False,False
+        a.com,Bitsquatting,q.com,999.999.999.999,False,False
+        a.com,Original*,a.com,999.999.999.999,False,False
+        a.com,Replacement,1.com,999.999.999.999,False,False
+        a.com,Replacement,2.com,999.999.999.999,False,False
+        a.com,Replacement,s.com,999.999.999.999,False,False
+        a.com,Replacement,w.com,999.999.999.999,False,False
+        a.com,Replacement,y.com,999.999.999.999,False,False
+        a.com,Replacement,z.com,999.999.999.999,False,False
+        a.com,Various,acom.com,999.999.999.999,False,False
+        a.com,Various,wwa.com,999.999.999.999,False,False
+        a.com,Various,www-a.com,999.999.999.999,False,False
+        a.com,Various,wwwa.com,999.999.999.999,False,False
+        a.com,Vowel swap,o.com,999.999.999.999,False,False
+        a.com,Vowel swap,u.com,999.999.999.999,False,False
     """).strip()
 
 
+def test_csv_export_quoting(webapp, monkeypatch):
+    """Test CSV export quotes values as required."""
+    monkeypatch.setattr(
+        'dnstwister.tools.iter_fuzzy_domains',
+        lambda domain: iter([FuzzResult('Odd, "fuzzer"', Domain('a.co'))])
+    )
+    monkeypatch.setattr(
+        'dnstwister.tools.resolve_all', patches.resolve_all
+    )
+
+    response = webapp.get('/search/{}/csv'.format(Domain('a.com').to_hex()))
+
+    assert response.text == (
+        'Domain,Type,Tweak,IP,Error,Wildcard\n'
+        'a.com,"Odd, ""fuzzer""",a.co,999.999.999.999,False,False\n'
+    )
+
+
+def test_csv_export_is_chunked(webapp, monkeypatch):
+    """Test CSV export is sent in chunks of around CSV_CHUNK_SIZE."""
+    monkeypatch.setattr(
+        'dnstwister.tools.resolve_all', patches.resolve_all
+    )
+    monkeypatch.setattr(
+        'dnstwister.views.www.search.CSV_CHUNK_SIZE', 1000
+    )
+
+    domain = Domain('a.com')
+    with dnstwister.app.test_request_context():
+        chunks = list(dnstwister.views.www.search.csv_chunks(domain))
+
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 1000 for chunk in chunks[:-1])
+
+    response = webapp.get('/search/{}/csv'.format(domain.to_hex()))
+    assert response.text == ''.join(chunks)
+
+
+def test_gzipped_csv_export(webapp, monkeypatch):
+    """Test gzip-compressed CSV export."""
+    monkeypatch.setattr(
+        'dnstwister.tools.resolve_all', patches.resolve_all
+    )
+
+    hexdomain = Domain('a.com').to_hex()
+
+    response = webapp.get('/search/{}/csv.gz'.format(hexdomain))
+
+    assert response.headers['Content-Disposition'] == 'attachment; filename=dnstwister_report_a.com.csv.gz'
+    assert response.headers['Content-Type'] == 'application/gzip'
+
+    csv_text = webapp.get('/search/{}/csv'.format(hexdomain)).text
+    assert gzip.decompress(response.body).decode('utf-8') == csv_text
+
+
 def test_json_export(webapp, monkeypatch):
     """Test JSON export"""
     monkeypatch.setattr(
         'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
     )
     monkeypatch.setattr(
-        'dnstwister.tools.resolve', lambda domain: ('999.999.999.999', False)
+        'dnstwister.tools.resolve_all', patches.resolve_all
     )
 
     domain = Domain('a.com')
@@ -93,7 +161,8 @@ def test_json_export(webapp, monkeypatch):
                     u'hex': u'612e636f6d',
                     u'resolution': {
                         u'error': False,
-                        u'ip': u'999.999.999.999'
+                        u'ip': u'999.999.999.999',
+                        u'wildcard': False,
                     }
                 },
                 {
@@ -102,7 +171,8 @@ def test_json_export(webapp, monkeypatch):
                     u'hex': u'612e636f',
                     u'resolution': {
                         u'error': False,
-                        u'ip': u'999.999.999.999'
+                        u'ip': u'999.999.999.999',
+                        u'wildcard': False,
                     }
                 }
             ]
@@ -116,7 +186,7 @@ def test_json_export_one_domain(webapp, monkeypatch):
         'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
     )
     monkeypatch.setattr(
-        'dnstwister.tools.resolve', lambda domain: ('999.999.999.999', False)
+        'dnstwister.tools.resolve_all', patches.resolve_all
     )
 
     domains = ('a.com',)
@@ -135,7 +205,8 @@ def test_json_export_one_domain(webapp, monkeypatch):
                     u'hex': u'612e636f6d',
                     u'resolution': {
                         u'error': False,
-                        u'ip': u'999.999.999.999'
+                        u'ip': u'999.999.999.999',
+                        u'wildcard': False,
                     }
                 },
                 {
@@ -144,7 +215,8 @@ def test_json_export_one_domain(webapp, monkeypatch):
                     u'hex': u'612e636f',
                     u'resolution': {
                         u'error': False,
-                        u'ip': u'999.999.999.999'
+                        u'ip': u'999.999.999.999',
+                        u'wildcard': False,
                     }
                 }
             ]
@@ -158,7 +230,7 @@ def test_json_export_no_fuzzy(webapp, monkeypatch):
         'dnstwister.tools.dnstwist.DomainFuzzer', patches.NoFuzzer
     )
     monkeypatch.setattr(
-        'dnstwister.tools.resolve', lambda domain: ('999.999.999.999', False)
+        'dnstwister.tools.resolve_all', patches.resolve_all
     )
 
     domains = ('a.com',)
@@ -177,7 +249,8 @@ def test_json_export_no_fuzzy(webapp, monkeypatch):
                     u'hex': u'612e636f6d',
                     u'resolution': {
                         u'error': False,
-                        u'ip': u'999.999.999.999'
+                        u'ip': u'999.999.999.999',
+                        u'wildcard': False,
                     }
                 }
             ]
@@ -191,7 +264,7 @@ def test_json_export_formatting(webapp, monkeypatch):
         'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
     )
     monkeypatch.setattr(
-        'dnstwister.tools.resolve', lambda domain: ('999.999.999.999', False)
+        'dnstwister.tools.resolve_all', patches.resolve_all
     )
 
     domain = 'a.com'
@@ -211,7 +284,8 @@ def test_json_export_formatting(webapp, monkeypatch):
                         "hex": "612e636f6d",
                         "resolution": {
                             "error": false,
-                            "ip": "999.999.999.999"
+                            "ip": "999.999.999.999",
+                            "wildcard": false
                         }
                     },
                     {
@@ -220,7 +294,8 @@ def test_json_export_formatting(webapp, monkeypatch):
                         "hex": "612e636f",
                         "resolution": {
                             "error": false,
-                            "ip": "999.999.999.999"
+                            "ip": "999.999.999.999",
+                            "wildcard": false
                         }
                     }
                 ]
@@ -229,6 +304,71 @@ def test_json_export_formatting(webapp, monkeypatch):
     """).strip()
 
 
+def test_json_export_formatting_no_results(webapp, monkeypatch):
+    """Test the streamed JSON export is still valid with no results."""
+    monkeypatch.setattr(
+        'dnstwister.tools.iter_fuzzy_domains', lambda domain: iter(())
+    )
+
+    path = Domain('a.com').to_hex()
+
+    response = webapp.get('/search/{}/json'.format(path))
+
+    assert response.text == textwrap.dedent("""\
+        {
+            "a.com": {
+                "fuzzy_domains": []
+            }
+        }""")
+
+
+def test_ndjson_export(webapp, monkeypatch):
+    """Test newline-delimited JSON export."""
+    monkeypatch.setattr(
+        'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
+    )
+    monkeypatch.setattr(
+        'dnstwister.tools.resolve_all', patches.resolve_all
+    )
+
+    path = Domain('a.com').to_hex()
+
+    response = webapp.get('/search/{}/ndjson'.format(path))
+
+    assert response.headers['Content-Disposition'] == 'attachment; filename=dnstwister_report_a.com.ndjson'
+    assert response.headers['Content-Type'] == 'application/x-ndjson'
+
+    assert response.text == (
+        '{"domain-name":"a.com","fuzzer":"Original*","hex":"612e636f6d",'
+        '"resolution":{"error":false,"ip":"999.999.999.999","wildcard":false}}\n'
+        '{"domain-name":"a.co","fuzzer":"Pretend","hex":"612e636f",'
+        '"resolution":{"error":false,"ip":"999.999.999.999","wildcard":false}}\n'
+    )
+
+
+def test_tsv_export(webapp, monkeypatch):
+    """Test TSV export."""
+    monkeypatch.setattr(
+        'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
+    )
+    monkeypatch.setattr(
+        'dnstwister.tools.resolve_all', patches.resolve_all
+    )
+
+    path = Domain('a.com').to_hex()
+
+    response = webapp.get('/search/{}/tsv'.format(path))
+
+    assert response.headers['Content-Disposition'] == 'attachment; filename=dnstwister_report_a.com.tsv'
+    assert response.headers['Content-Type'].startswith('text/tab-separated-values')
+
+    assert response.text == (
+        'Domain\tType\tTweak\tIP\tError\tWildcard\n'
+        'a.com\tOriginal*\ta.com\t999.999.999.999\tFalse\tFalse\n'
+        'a.com\tPretend\ta.co\t999.999.999.999\tFalse\tFalse\n'
+    )
+
+
 def test_failed_export(webapp):
     """Test unknown-format export"""
     domain = 'a.com'
@@ -246,6 +386,9 @@ def test_links_on_report(webapp):
 
     assert '/search/{}/csv'.format(hexdomain) in page_html
     assert '/search/{}/json'.format(hexdomain) in page_html
+    assert '/search/{}/csv.gz'.format(hexdomain) in page_html
+    assert '/search/{}/ndjson'.format(hexdomain) in page_html
+    assert '/search/{}/tsv'.format(hexdomain) in page_html
 
 
 def test_json_export_unicode_domain(webapp, monkeypatch):
@@ -254,7 +397,7 @@ def test_json_export_unicode_domain(webapp, monkeypatch):
         'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
     )
     monkeypatch.setattr(
-        'dnstwister.tools.resolve', lambda domain: ('999.999.999.999', False)
+        'dnstwister.tools.resolve_all', patches.resolve_all
     )
 
     domain = u'a\u00E0.com'  # almost 'aa.com'
@@ -273,7 +416,8 @@ def test_json_export_unicode_domain(webapp, monkeypatch):
                     u'hex': u'786e2d2d612d7366612e636f6d',
                     u'resolution': {
                         u'error': False,
-                        u'ip': u'999.999.999.999'
+                        u'ip': u'999.999.999.999',
+                        u'wildcard': False,
                     }
                 },
                 {
@@ -282,7 +426,8 @@ def test_json_export_unicode_domain(webapp, monkeypatch):
                     u'hex': u'786e2d2d612d7366612e636f',
                     u'resolution': {
                         u'error': False,
-                        u'ip': u'999.999.999.999'
+                        u'ip': u'999.999.999.999',
+                        u'wildcard': False,
                     }
                 }
             ]
@@ -293,7 +438,7 @@ def test_json_export_unicode_domain(webapp, monkeypatch):
 def test_unicode_csv_export(webapp, monkeypatch):
     """Test CSV export with Unicode"""
     monkeypatch.setattr(
-        'dnstwister.tools.resolve', lambda domain: ('999.999.999.999', False)
+        'dnstwister.tools.resolve_all', patches.resolve_all
     )
 
     domain = u'a\u00E0.com'  # almost 'aa.com'
@@ -304,67 +449,122 @@ def test_unicode_csv_export(webapp, monkeypatch):
     assert response.headers['Content-Disposition'] == 'attachment; filename=dnstwister_report_xn--a-sfa.com.csv'
 
     assert '\n'.join(sorted(response.text.strip().split('\n'))) == textwrap.dedent("""
-        Domain,Type,Tweak,IP,Error
-        xn--a-sfa.com,Addition,xn--aa-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ab-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ac-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ad-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ae-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--af-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ag-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ah-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ai-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--aj-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ak-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--al-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--am-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--an-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ao-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ap-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--aq-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ar-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--as-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--at-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--au-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--av-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--aw-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ax-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--ay-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Addition,xn--az-jia.com,999.999.999.999,False
-        xn--a-sfa.com,Bitsquatting,xn--c-sfa.com,999.999.999.999,False
-        xn--a-sfa.com,Bitsquatting,xn--e-sfa.com,999.999.999.999,False
-        xn--a-sfa.com,Bitsquatting,xn--i-sfa.com,999.999.999.999,False
-        xn--a-sfa.com,Bitsquatting,xn--q-sfa.com,999.999.999.999,False
-        xn--a-sfa.com,Homoglyph,xn--0ca15e.com,999.999.999.999,False
-        xn--a-sfa.com,Homoglyph,xn--0ca3e.com,999.999.999.999,False
-        xn--a-sfa.com,Homoglyph,xn--0ca743m.com,999.999.999.999,False
-        xn--a-sfa.com,Homoglyph,xn--0ca76d.com,999.999.999.999,False
-        xn--a-sfa.com,Homoglyph,xn--0ca7e.com,999.999.999.999,False
-        xn--a-sfa.com,Homoglyph,xn--0ca98b.com,999.999.999.999,False
-        xn--a-sfa.com,Homoglyph,xn--0caa.com,999.999.999.999,False
-        xn--a-sfa.com,Homoglyph,xn--0cab.com,999.999.999.999,False
-        xn--a-sfa.com,Homoglyph,xn--0cad.com,999.999.999.999,False
-        xn--a-sfa.com,Homoglyph,xn--0caf.com,999.999.999.999,False
-        xn--a-sfa.com,Homoglyph,xn--0cah.com,999.999.999.999,False
-        xn--a-sfa.com,Homoglyph,xn--0caj.com,999.999.999.999,False
-        xn--a-sfa.com,Hyphenation,xn--a--kia.com,999.999.999.999,False
-        xn--a-sfa.com,Omission,a.com,999.999.999.999,False
-        xn--a-sfa.com,Omission,xn--0ca.com,999.999.999.999,False
-        xn--a-sfa.com,Original*,xn--a-sfa.com,999.999.999.999,False
-        xn--a-sfa.com,Repetition,xn--a-sfaa.com,999.999.999.999,False
-        xn--a-sfa.com,Repetition,xn--aa-kia.com,999.999.999.999,False
-        xn--a-sfa.com,Replacement,xn--1-sfa.com,999.999.999.999,False
-        xn--a-sfa.com,Replacement,xn--2-sfa.com,999.999.999.999,False
-        xn--a-sfa.com,Replacement,xn--s-sfa.com,999.999.999.999,False
-        xn--a-sfa.com,Replacement,xn--w-sfa.com,999.999.999.999,False
-        xn--a-sfa.com,Replacement,xn--y-sfa.com,999.999.999.999,False
-        xn--a-sfa.com,Replacement,xn--z-sfa.com,999.999.999.999,False
-        xn--a-sfa.com,Subdomain,a.xn--0ca.com,999.999.999.999,False
-        xn--a-sfa.com,Transposition,xn--a-rfa.com,999.999.999.999,False
-        xn--a-sfa.com,Various,xn--acom-0na.com,999.999.999.999,False
-        xn--a-sfa.com,Various,xn--wwa-cla.com,999.999.999.999,False
-        xn--a-sfa.com,Various,xn--www-a-vqa.com,999.999.999.999,False
-        xn--a-sfa.com,Various,xn--wwwa-3na.com,999.999.999.999,False
-        xn--a-sfa.com,Vowel swap,xn--o-sfa.com,999.999.999.999,False
-        xn--a-sfa.com,Vowel swap,xn--u-sfa.com,999.999.999.999,False
+        Domain,Type,Tweak,IP,Error,Wildcard
+        xn--a-sfa.com,Addition,xn--aa-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ab-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ac-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ad-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ae-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--af-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ag-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ah-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ai-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--aj-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ak-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--al-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--am-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--an-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ao-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ap-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--aq-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ar-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--as-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--at-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--au-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--av-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--aw-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ax-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--ay-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Addition,xn--az-jia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Bitsquatting,xn--c-sfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Bitsquatting,xn--e-sfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Bitsquatting,xn--i-sfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Bitsquatting,xn--q-sfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Homoglyph,xn--0ca15e.com,999.999.999.999,False,False
+        xn--a-sfa.com,Homoglyph,xn--0ca3e.com,999.999.999.999,False,False
+        xn--a-sfa.com,Homoglyph,xn--0ca743m.com,999.999.999.999,False,False
+        xn--a-sfa.com,Homoglyph,xn--0ca76d.com,999.999.999.999,False,False
+        xn--a-sfa.com,Homoglyph,xn--0ca7e.com,999.999.999.999,False,False
+        xn--a-sfa.com,Homoglyph,xn--0ca98b.com,999.999.999.999,False,False
+        xn--a-sfa.com,Homoglyph,xn--0caa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Homoglyph,xn--0cab.com,999.999.999.999,False,False
+        xn--a-sfa.com,Homoglyph,xn--0cad.com,999.999.999.999,False,False
+        xn--a-sfa.com,Homoglyph,xn--0caf.com,999.999.999.999,False,False
+        xn--a-sfa.com,Homoglyph,xn--0cah.com,999.999.999.999,False,False
+        xn--a-sfa.com,Homoglyph,xn--0caj.com,999.999.999.999,False,False
+        xn--a-sfa.com,Hyphenation,xn--a--kia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Omission,a.com,999.999.999.999,False,False
+        xn--a-sfa.com,Omission,xn--0ca.com,999.999.999.999,False,False
+        xn--a-sfa.com,Original*,xn--a-sfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Repetition,xn--a-sfaa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Repetition,xn--aa-kia.com,999.999.999.999,False,False
+        xn--a-sfa.com,Replacement,xn--1-sfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Replacement,xn--2-sfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Replacement,xn--s-sfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Replacement,xn--w-sfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Replacement,xn--y-sfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Replacement,xn--z-sfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Subdomain,a.xn--0ca.com,999.999.999.999,False,False
+        xn--a-sfa.com,Transposition,xn--a-rfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Various,xn--acom-0na.com,999.999.999.999,False,False
+        xn--a-sfa.com,Various,xn--wwa-cla.com,999.999.999.999,False,False
+        xn--a-sfa.com,Various,xn--www-a-vqa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Various,xn--wwwa-3na.com,999.999.999.999,False,False
+        xn--a-sfa.com,Vowel swap,xn--o-sfa.com,999.999.999.999,False,False
+        xn--a-sfa.com,Vowel swap,xn--u-sfa.com,999.999.999.999,False,False
     """).strip()
+
+
+def test_stream(webapp, monkeypatch):
+    """Test streaming of resolution results as server-sent events."""
+    monkeypatch.setattr(
+        'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
+    )
+    monkeypatch.setattr(
+        'dnstwister.tools.resolve_all', patches.resolve_all
+    )
+
+    domain = Domain('a.com')
+    response = webapp.get('/search/{}/stream'.format(domain.to_hex()))
+
+    assert response.headers['Content-Type'].startswith('text/event-stream')
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert response.text == textwrap.dedent("""\
+        data: {"domain": "a.com", "domain_as_hexadecimal": "612e636f6d", "fuzzer": "Original*", "ip": "999.999.999.999", "error": false, "wildcard": false}
+
+        data: {"domain": "a.co", "domain_as_hexadecimal": "612e636f", "fuzzer": "Pretend", "ip": "999.999.999.999", "error": false, "wildcard": false}
+
+        event: done
+        data: {}
+
+    """)
+
+
+def test_exports_mark_wildcards(webapp, monkeypatch):
+    """Domains only resolving to a wildcard are marked in every export."""
+    monkeypatch.setattr(
+        'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
+    )
+    monkeypatch.setattr(
+        'dnstwister.tools.resolve_all', wildcard_resolve_all
+    )
+
+    path = Domain('a.com').to_hex()
+
+    assert webapp.get('/search/{}/csv'.format(path)).text == (
+        'Domain,Type,Tweak,IP,Error,Wildcard\n'
+        'a.com,Original*,a.com,999.999.999.999,False,False\n'
+        'a.com,Pretend,a.co,999.999.999.999,False,True\n'
+    )
+
+    results = webapp.get('/search/{}/json'.format(path)).json['a.com']
+    assert [result['resolution']['wildcard']
+            for result
+            in results['fuzzy_domains']] == [False, True]
+
+    ndjson = webapp.get('/search/{}/ndjson'.format(path)).text
+    assert ndjson.splitlines()[1].endswith('"wildcard":true}}')
+
+    stream = webapp.get('/search/{}/stream'.format(path)).text
+    assert '"domain": "a.co", ' in stream
+    assert stream.count('"wildcard": true') == 1
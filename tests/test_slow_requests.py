@@ -1,5 +1,6 @@
 import datetime
 
+import dnstwister.api.checks.parked
 import dnstwister.tools
 from dnstwister.core.domain import Domain
 
@@ -21,3 +22,29 @@ def test_large_domain_is_reasonable_in_performance():
     assert duration < 10, 'duration too long: {} secs'.format(duration)
 
     print('Long domain name fuzzed in: {} seconds'.format(duration))
+
+
+def test_parked_second_level_is_reasonable_in_performance():
+    """Finding the second-level of a domain used to scan every TLD in the
+    database, many times per parked check.
+
+    This is a basic benchmark to make sure it stays a per-label lookup.
+    """
+    domains = [
+        Domain('www.example.com'),
+        Domain('www2.example.co.uk'),
+        Domain('a.b.c.d.example.com.au'),
+        Domain('www.example.co.ck'),
+    ]
+
+    start = datetime.datetime.now()
+
+    for _ in range(2500):
+        for domain in domains:
+            dnstwister.api.checks.parked.second_level(domain)
+
+    duration = (datetime.datetime.now() - start).total_seconds()
+
+    assert duration < 1, 'duration too long: {} secs'.format(duration)
+
+    print('10,000 second-levels found in: {} seconds'.format(duration))
@@ -76,13 +76,12 @@ class TestTools(unittest.TestCase):
             'We only return fuzzy domains in report'
         )
 
-        assert results[1]['fuzzy_domains'][0] == {
-            'domain-name': 'a.com',
-            'fuzzer': 'Original*',
-            'hex': '612e636f6d'
-        }
+        original = results[1]['fuzzy_domains'][0]
+        assert original.unicode == 'a.com'
+        assert original.fuzzer == dnstwist.Fuzzer.ORIGINAL
+        assert original.hex == '612e636f6d'
 
-        results = map(operator.itemgetter('domain-name'), results[1]['fuzzy_domains'])
+        results = map(operator.attrgetter('unicode'), results[1]['fuzzy_domains'])
         assert sorted(results) == [
             '1.com',
             '2.com',
@@ -134,3 +133,70 @@ def test_encode_bonkers_unicode():
     """Some unicode is not "valid"."""
     unicode_domain = u'a\uDFFFa.com'
     assert Domain.try_parse(unicode_domain) is None
+
+
+def test_fuzz_results_are_cached(monkeypatch):
+    """Fuzzing is only run once per domain, while cached."""
+    domain = Domain('a.com')
+    results = tools.fuzzy_domains(domain)
+
+    assert tools.FUZZ_CACHE.stats['misses'] == 1
+    assert isinstance(results, tuple)
+
+    def no_fuzzing(*args):
+        raise Exception('Should not fuzz')
+    monkeypatch.setattr('dnstwister.tools.dnstwist.DomainFuzzer', no_fuzzing)
+
+    assert tools.fuzzy_domains(domain) is results
+    assert tuple(tools.iter_fuzzy_domains(domain)) == results
+    assert tools.FUZZ_CACHE.stats['hits'] == 2
+
+
+def test_streamed_fuzz_results_are_cached_once_complete():
+    """Partially-consumed streams are not cached."""
+    domain = Domain('a.com')
+
+    next(tools.iter_fuzzy_domains(domain))
+    assert len(tools.FUZZ_CACHE) == 0
+
+    results = tuple(tools.iter_fuzzy_domains(domain))
+    assert tools.fuzzy_domains(domain) == results
+    assert tools.FUZZ_CACHE.stats['hits'] == 1
+
+
+def test_resolutions_are_cached(monkeypatch):
+    """Domains are only resolved once, while cached."""
+    lookups = []
+
+    async def fake_lookup(idna_domain, mx):
+        if idna_domain.startswith('dnstwister-'):
+            # The wildcard probe of example.com.
+            return tools.async_dns.Resolution(
+                idna_domain, 'NXDOMAIN', (), None, 0.01
+            ), None
+        lookups.append(idna_domain)
+        resolution = tools.async_dns.Resolution(
+            idna_domain, 'NOERROR', ('1.2.3.4',), None, 0.01
+        )
+        return resolution, 300
+    monkeypatch.setattr(tools.DNS_ENGINE, '_lookup', fake_lookup)
+
+    domain = Domain('www.example.com')
+    assert tools.resolve(domain) == ('1.2.3.4', False)
+    assert tools.resolve(Domain('WWW.example.com')) == ('1.2.3.4', False)
+    assert tools.resolve_details(domain).addresses == ('1.2.3.4',)
+
+    assert lookups == ['www.example.com']
+    assert tools.RESOLVE_CACHE.stats['hits'] == 2
+
+
+def test_resolution_cache_ttls():
+    """Failures are cached briefly, successes for their record TTLs."""
+    ttl = tools.dns_cache.result_ttl
+
+    assert ttl(('1.2.3.4', False), 600) == 600
+    assert ttl(('1.2.3.4', False), 0) == tools.dns_cache.MIN_TTL
+    assert ttl(('1.2.3.4', False), 86400) == tools.dns_cache.MAX_TTL
+    assert ttl(('1.2.3.4', False)) == tools.dns_cache.DEFAULT_TTL
+    assert ttl((False, False), 600) == tools.dns_cache.NEGATIVE_TTL
+    assert ttl((False, True)) == tools.dns_cache.ERROR_TTL